@@ -2,51 +2,106 @@
 ### DOWNLOAD NEWS ETL ###
 #########################
 
+import asyncio
 import json
+import threading
 import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
 from datetime import datetime, timedelta, timezone
 from typing import Literal
 
 # import click
 import httpx
-import newspaper
-import nltk
-import pymongo
 from dotenv import find_dotenv, load_dotenv
 from envparse import env
 from loguru import logger
 from logutil import init_loguru
-from pymongo.errors import BulkWriteError
+from pymongo.errors import DuplicateKeyError
 
-from db.llm_summary import add_gpt_info
+from db.html_store import migrate_inline_html, store_html_pages
+from db.llm_summary import (
+    TEXT_MODEL_SUMMARIZER_BATCH_SIZE,
+    TEXT_MODEL_SUMMARIZER_MAX_CONCURRENCY,
+    add_gpt_info_async,
+)
+from db.near_duplicates import MinHashLSHIndex, index_saved_article, link_near_duplicates
+from db.page_downloader import NEWS_DOWNLOAD_MAX_CONCURRENCY, PageDownloader
+from db.page_parser import (
+    NEWS_PARSE_NLP,
+    NEWS_PARSE_WORKERS,
+    ensure_nltk_data,
+    parse_page_async,
+)
+from db.watermarks import advance_watermark, get_watermark
 from prefect import flow, task
+from prefect.futures import wait
 from prefect.schedules import Interval
+from prefect.task_runners import ThreadPoolTaskRunner
+from shared.llm_telemetry import track_llm_usage
+from shared.mongo_utils import ensure_news_indexes, get_news_collection
 from shared.paths import DB_ETL_LOG_PATH
 
 load_dotenv(find_dotenv())
 
 GNEWS_API_KEY = env.str("GNEWS_API_KEY")
 GNEWS_URL = "https://gnews.io/api/v4/search"
-GNEWS_SORT_BY: Literal["publishedAt", "relevance"] = "relevance"
+GNEWS_SORT_BY: Literal["publishedAt", "relevance"] = "publishedAt"  # newest first, for paging
 GNEWS_MAX_ARTICLES: int = 10
+GNEWS_MAX_PAGES = env.int("GNEWS_MAX_PAGES", default=10)
 GNEWS_LANG = "en"
-MONGO_USER = env.str("MONGO_INITDB_ROOT_USERNAME")
-MONGO_PASSWORD = env.str("MONGO_INITDB_ROOT_PASSWORD")
-MONGO_HOST = env.str("MONGO_HOST")
-MONGO_PORT = env.int("MONGO_PORT")
-MONGODB_URI = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}?retryWrites=true&w=majority"
-MONGO_NEWS_DB = "news"
-MONGO_NEWS_COLLECTION = "gnews"
+GNEWS_MIN_REQUEST_INTERVAL_SECONDS = env.float("GNEWS_MIN_REQUEST_INTERVAL_SECONDS", default=1.0)
 NEWS_QUERIES = ["finance", "energy", "weather", "murders", "funny"]
 NEWS_QUERY_EVERY_X_SECONDS = env.int("NEWS_QUERY_EVERY_X_SECONDS")
 NEWS_QUERY_WINDOW_EXTENSION_SECONDS = env.int("NEWS_QUERY_WINDOW_EXTENSION_SECONDS")
+NEWS_WATERMARK_MAX_LOOKBACK_SECONDS = env.int(
+    "NEWS_WATERMARK_MAX_LOOKBACK_SECONDS", default=7 * 24 * 3600
+)
+NEWS_QUERY_MAX_CONCURRENCY = env.int("NEWS_QUERY_MAX_CONCURRENCY", default=len(NEWS_QUERIES))
+NEWS_RECENT_URLS_MAX_SIZE = env.int("NEWS_RECENT_URLS_MAX_SIZE", default=10_000)
+# a pending article (download, parse or summary failed) is retried until it has this many runs
+NEWS_ARTICLE_MAX_ATTEMPTS = env.int("NEWS_ARTICLE_MAX_ATTEMPTS", default=3)
+NEWS_STATUS_DONE = "done"  # summarized, or linked to its canonical article
+NEWS_STATUS_PENDING = "pending"
+NEWS_PIPELINE_QUEUE_SIZE = env.int(
+    "NEWS_PIPELINE_QUEUE_SIZE", default=2 * TEXT_MODEL_SUMMARIZER_BATCH_SIZE
+)
+NEWS_SUMMARIZE_WORKERS = env.int("NEWS_SUMMARIZE_WORKERS", default=4)
+# how long a summarize worker waits for more articles to fill its batch
+NEWS_SUMMARIZE_BATCH_LINGER_SECONDS = env.float("NEWS_SUMMARIZE_BATCH_LINGER_SECONDS", default=1.0)
+
+NEWS_LISTING_FIELDS = [
+    "title",
+    "description",
+    "partial_text",
+    "url",
+    "published_at",
+    "media_source_name",
+    "media_source_url",
+    "listing_query",
+    "listing_source",
+]
+
+_STAGE_DONE = object()
+
+_gnews_next_request_at = 0.0
+_gnews_rate_lock = threading.Lock()
+
+_recent_urls: OrderedDict[str, None] = OrderedDict()
+_recent_urls_lock = threading.Lock()
 
 init_loguru(file_path=str(DB_ETL_LOG_PATH))
-logger.info("downloadeding nltk punkt...")
-# nltk.download("punkt", download_dir=NLTK_DOWNLOADS_DIR, quiet=True, raise_on_error=True)
-nltk.download("punkt", raise_on_error=True)
-nltk.download("punkt_tab", raise_on_error=True)
-logger.info("downloaded nltk punkt")
+
+
+def _wait_for_gnews_rate_budget() -> None:
+    """Space out GNews API requests across all concurrent query tasks in the process."""
+    global _gnews_next_request_at
+    with _gnews_rate_lock:
+        now = time.monotonic()
+        request_at = max(now, _gnews_next_request_at)
+        _gnews_next_request_at = request_at + GNEWS_MIN_REQUEST_INTERVAL_SECONDS
+    if request_at > now:
+        time.sleep(request_at - now)
 
 
 def get_news_links_gnews(
@@ -77,6 +132,7 @@ def get_news_links_gnews(
     else:
         to_s = "none"
 
+    _wait_for_gnews_rate_budget()
     response = httpx.get(GNEWS_URL, params=params, timeout=60)
     data = json.loads(response.read().decode("utf-8"))
     if "articles" in data:
@@ -115,59 +171,289 @@ def get_news_links_gnews(
     return formatted_news_listings
 
 
-def load_news_articles(news_listings: list[dict]) -> None:
-    for listing in news_listings:
-        try:
-            page = newspaper.Article(listing["url"])
-            page.download()
-            page.parse()
-            page.nlp()
-        except Exception as e:
-            logger.exception(e)
-        else:
-            listing["full_text"] = page.text
-            listing["full_html"] = page.html
-            listing["tags"] = list(page.tags)
-            listing["nltk_summary"] = page.summary
-            listing["nltk_keywords"] = page.keywords
-            logger.debug(f"downloaded and parsed news article title='{listing['title']}'")
-        time.sleep(0.5)
-    logger.info(f"downloaded and parsed full news articles count={len(news_listings)}")
-
-
-def save_to_mongo_db(news_articles: list[dict]) -> None:
-    client: pymongo.MongoClient = pymongo.MongoClient(MONGODB_URI)
-    db = client.get_database(MONGO_NEWS_DB)
-    collection = db[MONGO_NEWS_COLLECTION]
-    collection.create_index([("url", pymongo.ASCENDING)], unique=True)
+def get_news_listings_paged(
+    query: str, from_: datetime | None, to_: datetime | None
+) -> tuple[list[dict], bool]:
+    """Page backwards through the listings published between `from_` and `to_`, newest first.
+
+    Each next page ends at the oldest listing of the previous one, until a page comes back
+    short. Returns the listings (unique urls) and whether the window was fully covered
+    (False if GNEWS_MAX_PAGES was reached first)."""
+
+    listings: dict[str, dict] = {}
+    page_to = to_
+    for _ in range(GNEWS_MAX_PAGES):
+        page = get_news_links_gnews(
+            query=query,
+            from_=from_,
+            to_=page_to,
+            lang=GNEWS_LANG,
+            limit=GNEWS_MAX_ARTICLES,
+            sortby=GNEWS_SORT_BY,
+        )
+        for listing in page:
+            listings.setdefault(listing["url"], listing)
+        if len(page) < GNEWS_MAX_ARTICLES:
+            return list(listings.values()), True
+        oldest = min(x["published_at"] for x in page)
+        if (page_to is not None) and (oldest >= page_to):
+            oldest = page_to - timedelta(seconds=1)  # a full page within one second
+        page_to = oldest
+    logger.warning(
+        f"news listings window not fully covered {query=} pages={GNEWS_MAX_PAGES} "
+        f"count={len(listings)}"
+    )
+    return list(listings.values()), False
+
+
+def _remember_urls(urls: list[str]) -> None:
+    with _recent_urls_lock:
+        for url in urls:
+            _recent_urls[url] = None
+            _recent_urls.move_to_end(url)
+        while len(_recent_urls) > NEWS_RECENT_URLS_MAX_SIZE:
+            _recent_urls.popitem(last=False)
+
+
+def drop_known_news_listings(news_listings: list[dict]) -> list[dict]:
+    """Drop listings whose url is already stored (or repeated within the batch).
+
+    Checks the in-process recent-url set first, then all remaining urls in one mongo query.
+    Pending articles are kept, until they ran out of attempts."""
+
+    unique_listings: dict[str, dict] = {}
+    with _recent_urls_lock:
+        for listing in news_listings:
+            url = listing["url"]
+            if (url not in _recent_urls) and (url not in unique_listings):
+                unique_listings[url] = listing
+    if len(unique_listings) > 0:
+        known_docs = get_news_collection().find(
+            {
+                "url": {"$in": list(unique_listings.keys())},
+                "$or": [
+                    {"etl_status": {"$ne": NEWS_STATUS_PENDING}},
+                    {"etl_attempts": {"$gte": NEWS_ARTICLE_MAX_ATTEMPTS}},
+                ],
+            },
+            projection={"_id": 0, "url": 1},
+        )
+        known_urls = [doc["url"] for doc in known_docs]
+        _remember_urls(known_urls)
+        for url in known_urls:
+            unique_listings.pop(url, None)
+    new_listings = list(unique_listings.values())
+    logger.info(
+        f"dropped known news listings count={len(news_listings) - len(new_listings)} "
+        f"new={len(new_listings)}"
+    )
+    return new_listings
+
+
+def get_pending_news_listings(query: str, from_: datetime) -> list[dict]:
+    """Listings of the query's pending articles published after `from_` (to retry them)."""
+    docs = get_news_collection().find(
+        {
+            "listing_query": query,
+            "etl_status": NEWS_STATUS_PENDING,
+            "etl_attempts": {"$lt": NEWS_ARTICLE_MAX_ATTEMPTS},
+            "published_at": {"$gt": from_},
+        },
+        projection={"_id": 0, **dict.fromkeys(NEWS_LISTING_FIELDS, 1)},
+    )
+    pending_listings = list(docs)
+    if len(pending_listings) > 0:
+        logger.info(f"retrying pending news articles count={len(pending_listings)} {query=}")
+    return pending_listings
+
+
+def save_news_article(news_article: dict) -> None:
+    """Upsert one news article by url (idempotent, so retries never duplicate it).
+
+    An article that is not summarized (nor a duplicate) is saved as pending: a later run
+    downloads and summarizes it again, and sets the missing fields. A done article is never
+    overwritten."""
+    store_html_pages([news_article])
+    url = news_article["url"]
+    is_done = ("gpt_summary" in news_article) or ("duplicate_of" in news_article)
+    status = NEWS_STATUS_DONE if is_done else NEWS_STATUS_PENDING
+    doc = {k: v for k, v in news_article.items() if k != "url"}
     try:
-        collection.insert_many(news_articles, ordered=False)
-    except BulkWriteError as e:
-        logger.warning("error on mongo bulk insert: " + str(e)[:300])
-    logger.info("saved news articles to mongo db")
+        get_news_collection().update_one(
+            {"url": url, "etl_status": NEWS_STATUS_PENDING},
+            {"$set": {**doc, "etl_status": status}, "$inc": {"etl_attempts": 1}},
+            upsert=True,
+        )
+    except DuplicateKeyError:  # done (or stored before the status), e.g. by a concurrent query
+        logger.debug(f"news article already saved (skip) title='{news_article['title']}'")
+        return
+    if is_done:
+        _remember_urls([url])
+        index_saved_article(news_article)
+    logger.debug(f"saved news article to mongo db {status=} title='{news_article['title']}'")
+
+
+async def _run_stage(
+    handler: Callable[[list[dict]], Awaitable[list[dict]]],
+    in_queue: asyncio.Queue,
+    out_queue: asyncio.Queue | None,
+    n_workers: int,
+    batch_size: int = 1,
+    batch_linger_seconds: float = 0.0,
+) -> None:
+    """Consume items with `n_workers` workers and pass the handler results downstream.
+
+    The workers take turns to collect a batch: up to `batch_size` items, waiting at most
+    `batch_linger_seconds` after the first one for the batch to fill.
+    The bounded queues give backpressure: a slow stage blocks the stages before it."""
+
+    collect_lock = asyncio.Lock()
+    loop = asyncio.get_running_loop()
+
+    async def collect() -> list:
+        async with collect_lock:
+            batch = [await in_queue.get()]
+            deadline = loop.time() + batch_linger_seconds
+            while (len(batch) < batch_size) and (batch[-1] is not _STAGE_DONE):
+                if not in_queue.empty():
+                    batch.append(in_queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(in_queue.get(), timeout))
+                except TimeoutError:
+                    break
+        return batch
+
+    async def worker() -> None:
+        done = False
+        while not done:
+            batch = await collect()
+            if any(item is _STAGE_DONE for item in batch):
+                batch = [item for item in batch if item is not _STAGE_DONE]
+                await in_queue.put(_STAGE_DONE)  # let the sibling workers stop too
+                done = True
+            if len(batch) == 0:
+                continue
+            for result in await handler(batch):
+                if out_queue is not None:
+                    await out_queue.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(n_workers)))
+    if out_queue is not None:
+        await out_queue.put(_STAGE_DONE)
+
+
+async def _process_news_listings(news_listings: list[dict]) -> None:
+    """Stream listings through download -> parse -> summarize -> upsert.
+
+    Every article is saved as soon as it is enriched, so a failure late in the run keeps
+    the finished articles (and a retry skips them in `drop_known_news_listings`).
+    Articles that failed along the way are saved as pending, to be retried."""
+
+    download_queue: asyncio.Queue = asyncio.Queue(maxsize=NEWS_PIPELINE_QUEUE_SIZE)
+    parse_queue: asyncio.Queue = asyncio.Queue(maxsize=NEWS_PIPELINE_QUEUE_SIZE)
+    summarize_queue: asyncio.Queue = asyncio.Queue(
+        maxsize=max(NEWS_PIPELINE_QUEUE_SIZE, TEXT_MODEL_SUMMARIZER_BATCH_SIZE)
+    )
+    upsert_queue: asyncio.Queue = asyncio.Queue(maxsize=NEWS_PIPELINE_QUEUE_SIZE)
+
+    llm_semaphore = asyncio.Semaphore(TEXT_MODEL_SUMMARIZER_MAX_CONCURRENCY)
+    run_index = MinHashLSHIndex()  # canonical listings of this run, not saved yet
+
+    async def produce() -> None:
+        for listing in news_listings:
+            await download_queue.put(listing)
+        await download_queue.put(_STAGE_DONE)
+
+    async with PageDownloader() as downloader:
+
+        async def download(listings: list[dict]) -> list[dict]:
+            for listing in listings:
+                listing["_html"] = await downloader.download(listing["url"])
+            return listings
+
+        async def parse(listings: list[dict]) -> list[dict]:
+            for listing in listings:
+                html = listing.pop("_html")
+                if html is not None:
+                    fields = await parse_page_async(listing["url"], html)
+                    if fields is not None:
+                        listing.update(fields)
+                        logger.debug(
+                            f"downloaded and parsed news article title='{listing['title']}'"
+                        )
+            link_near_duplicates(listings, run_index=run_index)
+            return listings
+
+        async def summarize(listings: list[dict]) -> list[dict]:
+            to_summarize = [x for x in listings if "duplicate_of" not in x]
+            if len(to_summarize) > 0:
+                await add_gpt_info_async(to_summarize, semaphore=llm_semaphore)
+            return listings
+
+        async def upsert(listings: list[dict]) -> list[dict]:
+            for listing in listings:
+                await asyncio.to_thread(save_news_article, listing)
+            return []
+
+        await asyncio.gather(
+            produce(),
+            _run_stage(download, download_queue, parse_queue, NEWS_DOWNLOAD_MAX_CONCURRENCY),
+            _run_stage(parse, parse_queue, summarize_queue, NEWS_PARSE_WORKERS),
+            _run_stage(
+                summarize,
+                summarize_queue,
+                upsert_queue,
+                NEWS_SUMMARIZE_WORKERS,
+                batch_size=TEXT_MODEL_SUMMARIZER_BATCH_SIZE,
+                batch_linger_seconds=NEWS_SUMMARIZE_BATCH_LINGER_SECONDS,
+            ),
+            _run_stage(upsert, upsert_queue, None, 1),
+        )
 
 
 def load_news(
     query: str,
     from_: datetime | None,
     to_: datetime | None,
-) -> None:
-    """Load a news article, add a GPT summary and save to the local db"""
-
-    news_listings = get_news_links_gnews(
-        query=query,
-        from_=from_,
-        to_=to_,
-        lang=GNEWS_LANG,
-        limit=GNEWS_MAX_ARTICLES,
-        sortby=GNEWS_SORT_BY,
+) -> int:
+    """Load a news article, add a GPT summary and save to the local db
+
+    The query watermark only advances once the whole window was listed and saved, so an
+    incomplete window is listed again on the next run.
+
+    Returns the number of new news articles"""
+
+    news_listings, window_complete = get_news_listings_paged(query, from_=from_, to_=to_)
+    newest_published_at = max((x["published_at"] for x in news_listings), default=None)
+    lookback_from = datetime.now(tz=timezone.utc) - timedelta(
+        seconds=NEWS_WATERMARK_MAX_LOOKBACK_SECONDS
     )
+    news_listings += get_pending_news_listings(query, from_=lookback_from)
+    news_listings = drop_known_news_listings(news_listings)
     if len(news_listings) > 0:
-        load_news_articles(news_listings)
-        add_gpt_info(news_listings)
-        save_to_mongo_db(news_listings)
+        asyncio.run(_process_news_listings(news_listings))
+        logger.info(f"loaded, parsed and saved news articles count={len(news_listings)} {query=}")
     else:
         logger.info("no news articles to parse and save (skip)")
+    if (newest_published_at is not None) and window_complete:
+        advance_watermark(query, source="gnews", published_at=newest_published_at)
+    return len(news_listings)
+
+
+def get_query_from_time(query: str, time_now: datetime) -> datetime:
+    """Start of the query window: the query watermark, or the default window if there is none.
+
+    The watermark is capped by NEWS_WATERMARK_MAX_LOOKBACK_SECONDS to bound the catch-up."""
+    watermark = get_watermark(query, source="gnews")
+    if watermark is None:
+        return time_now - timedelta(
+            seconds=NEWS_QUERY_EVERY_X_SECONDS + NEWS_QUERY_WINDOW_EXTENSION_SECONDS
+        )
+    return max(watermark, time_now - timedelta(seconds=NEWS_WATERMARK_MAX_LOOKBACK_SECONDS))
 
 
 @task(
@@ -176,24 +462,45 @@ def load_news(
     retries=2,
     retry_delay_seconds=30,
 )
-def load_news_task(query, from_, to_=None):
+def load_news_task(query, from_, to_=None) -> int:
     """Task to load news for a specific query"""
     logger.info(f"start task to load news for query: {query}")
     return load_news(query, from_=from_, to_=to_)
 
 
-@flow(name="load_all_recent_news", log_prints=True)
-def load_all_recent_news_flow():
-    """Load all recent news articles, add a GPT summary and save to the local db"""
+@flow(
+    name="load_all_recent_news",
+    log_prints=True,
+    task_runner=ThreadPoolTaskRunner(max_workers=NEWS_QUERY_MAX_CONCURRENCY),
+)
+@track_llm_usage("load_all_recent_news")
+def load_all_recent_news_flow() -> dict[str, int]:
+    """Load all recent news articles, add a GPT summary and save to the local db
+
+    All queries run concurrently; a failed query does not stop the others"""
 
+    ensure_news_indexes()
     time_now = datetime.now(tz=timezone.utc)
-    time_from = time_now - timedelta(
-        seconds=NEWS_QUERY_EVERY_X_SECONDS + NEWS_QUERY_WINDOW_EXTENSION_SECONDS
-    )
-    for q in NEWS_QUERIES:
-        load_news_task(q, from_=time_from, to_=None)
+    futures = {
+        q: load_news_task.submit(q, from_=get_query_from_time(q, time_now), to_=None)
+        for q in NEWS_QUERIES
+    }
+    wait(list(futures.values()))
+
+    results: dict[str, int] = {}
+    failed_queries: list[str] = []
+    for q, future in futures.items():
+        if future.state.is_completed():
+            results[q] = future.result()
+            logger.info(f"loaded news for query={q} count={results[q]}")
+        else:
+            failed_queries.append(q)
+            logger.error(f"failed to load news for query={q} state={future.state.name}")
 
+    if len(failed_queries) > 0:
+        raise RuntimeError(f"failed to load news for queries={failed_queries} loaded={results}")
     logger.info("loaded, parsed and saved all recent news articles")
+    return results
 
 
 # @click.command("serve")
@@ -201,6 +508,10 @@ def start_news_etl_with_serve():
     """Start the normal news ETL using Prefect serve (blocking)"""
 
     logger.info("serving the normal news ETL...")
+    if NEWS_PARSE_NLP:
+        ensure_nltk_data()
+    ensure_news_indexes()
+    migrate_inline_html()
     schedule = Interval(
         timedelta(seconds=NEWS_QUERY_EVERY_X_SECONDS),
         anchor_date=datetime.now(tz=timezone.utc) + timedelta(seconds=5),
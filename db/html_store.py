@@ -0,0 +1,81 @@
+import zstandard
+from bson import Binary
+from envparse import env
+from loguru import logger
+from pymongo import UpdateOne
+
+from shared.mongo_utils import get_html_collection, get_news_collection
+
+HTML_ZSTD_LEVEL = env.int("HTML_ZSTD_LEVEL", default=10)
+
+
+def _compress_html(html: str) -> bytes:
+    return zstandard.ZstdCompressor(level=HTML_ZSTD_LEVEL).compress(html.encode("utf-8"))
+
+
+def store_html_pages(news_articles: list[dict]) -> None:
+    """Move `full_html` out of the news articles into the compressed html store.
+
+    Every article with html gets a `full_html_id` reference instead (the article is updated)."""
+
+    ops = []
+    n_bytes, n_compressed_bytes = 0, 0
+    for article in news_articles:
+        html = article.pop("full_html", None)
+        if html is None:
+            continue
+        blob = _compress_html(html)
+        n_bytes += len(html)
+        n_compressed_bytes += len(blob)
+        ops.append(
+            UpdateOne(
+                {"url": article["url"]},
+                {"$set": {"html_zstd": Binary(blob), "html_size": len(html)}},
+                upsert=True,
+            )
+        )
+    if len(ops) == 0:
+        return
+
+    collection = get_html_collection()
+    collection.bulk_write(ops, ordered=False)
+    urls = [a["url"] for a in news_articles]
+    html_ids = {
+        doc["url"]: doc["_id"]
+        for doc in collection.find({"url": {"$in": urls}}, projection={"url": 1})
+    }
+    for article in news_articles:
+        if article["url"] in html_ids:
+            article["full_html_id"] = html_ids[article["url"]]
+    logger.info(
+        f"stored compressed html pages count={len(ops)} size={n_bytes} "
+        f"compressed_size={n_compressed_bytes}"
+    )
+
+
+def migrate_inline_html(batch_size: int = 100) -> int:
+    """Move `full_html` of the already stored news articles into the html store.
+
+    Runs when the ETL starts, a no-op once no article has inline html.
+    Returns the number of migrated articles"""
+    news_collection = get_news_collection()
+    n_migrated = 0
+    while True:
+        docs = list(
+            news_collection.find(
+                {"full_html": {"$exists": True}},
+                projection={"_id": 1, "url": 1, "full_html": 1},
+                limit=batch_size,
+            )
+        )
+        if len(docs) == 0:
+            break
+        store_html_pages(docs)
+        for doc in docs:
+            news_collection.update_one(
+                {"_id": doc["_id"]},
+                {"$set": {"full_html_id": doc.get("full_html_id")}, "$unset": {"full_html": ""}},
+            )
+        n_migrated += len(docs)
+        logger.info(f"migrated inline html pages count={n_migrated}")
+    return n_migrated
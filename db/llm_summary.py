@@ -1,17 +1,28 @@
-import litellm
+import asyncio
+
 from dotenv import find_dotenv, load_dotenv
 from envparse import env
 from loguru import logger
 
-from shared.llm_utils import get_llm_json_response
+from db.text_budget import count_tokens, shape_article_text
+from shared.llm_utils import aget_llm_json_response
 
 load_dotenv(find_dotenv())
 
-OPENAI_API_KEY = env.str("OPENAI_API_KEY")
+OPENAI_API_KEY = env.str("OPENAI_API_KEY")  # read by litellm from the environment
 TEXT_MODEL_SUMMARIZER = env.str("TEXT_MODEL_SUMMARIZER")
 TEXT_MODEL_MAX_TOKENS = env.int("TEXT_MODEL_SUMMARIZER_MAX_TOKENS")
-
-litellm.openai_key = OPENAI_API_KEY
+TEXT_MODEL_SUMMARIZER_INPUT_MAX_TOKENS = env.int(
+    "TEXT_MODEL_SUMMARIZER_INPUT_MAX_TOKENS", default=3000
+)
+TEXT_MODEL_SUMMARIZER_BATCH_SIZE = env.int("TEXT_MODEL_SUMMARIZER_BATCH_SIZE", default=5)
+TEXT_MODEL_SUMMARIZER_BATCH_ARTICLE_MAX_TOKENS = env.int(
+    "TEXT_MODEL_SUMMARIZER_BATCH_ARTICLE_MAX_TOKENS", default=1000
+)
+TEXT_MODEL_SUMMARIZER_MAX_CONCURRENCY = env.int("TEXT_MODEL_SUMMARIZER_MAX_CONCURRENCY", default=5)
+TEXT_MODEL_SUMMARIZER_TIMEOUT_SECONDS = env.float(
+    "TEXT_MODEL_SUMMARIZER_TIMEOUT_SECONDS", default=90.0
+)
 
 
 def _parse_gpt_json_response(expected_fields: dict, response_json: dict) -> dict:
@@ -37,70 +48,221 @@ def _parse_gpt_json_response(expected_fields: dict, response_json: dict) -> dict
     return formatted_gpt_json
 
 
-def add_gpt_info(news_listings: list[dict]) -> None:
-    gpt_role = "You're a news editor"
-    gpt_query = (
-        "Return a json file based on the news article below. "
-        "Ignore ads and debugging messages related to the web. "
-        "JSON fields: "
-        "'summary' = a one-paragraph summary of the news article; "
-        "'keywords' = 5 to 10 keywords separated by a comma; "
-        "'sectors' = most relevant sectors separated by a comma; "
-        "'mood' = positive, negative, neutral, mixed, or unclear; "
-        "'breaking_news' = yes, no, or unclear; "
-        "'like_a_hollywood_movie' = yes, no, or unclear; "
-        "'trustworthy' = yes, no, or unclear; "
-        "'economic_impact' = high, medium, low, or unclear. "
-        "The news article:\n\n{text}"
+GPT_ROLE = "You're a news editor"
+GPT_FIELDS_PROMPT = (
+    "'summary' = a one-paragraph summary of the news article; "
+    "'keywords' = 5 to 10 keywords separated by a comma; "
+    "'sectors' = most relevant sectors separated by a comma; "
+    "'mood' = positive, negative, neutral, mixed, or unclear; "
+    "'breaking_news' = yes, no, or unclear; "
+    "'like_a_hollywood_movie' = yes, no, or unclear; "
+    "'trustworthy' = yes, no, or unclear; "
+    "'economic_impact' = high, medium, low, or unclear."
+)
+GPT_QUERY = (
+    "Return a json file based on the news article below. "
+    "Ignore ads and debugging messages related to the web. "
+    "JSON fields: " + GPT_FIELDS_PROMPT + " The news article:\n\n{text}"
+)
+GPT_BATCH_QUERY = (
+    "Return a json file based on the news articles below. "
+    "Ignore ads and debugging messages related to the web. "
+    "JSON fields: 'articles' = a list with one object per news article. "
+    "Each object has the field 'id' = the article id as given, and the fields: "
+    + GPT_FIELDS_PROMPT
+    + " The news articles:\n\n{texts}"
+)
+GPT_EXPECTED_FIELDS = {
+    "summary": {"choices": [], "split": False, "force_lower": False},
+    "keywords": {"choices": [], "split": True, "force_lower": False},
+    "sectors": {"choices": [], "split": True, "force_lower": True},
+    "mood": {
+        "choices": ["positive", "negative", "neutral", "mixed", "unclear"],
+        "split": False,
+        "force_lower": True,
+    },
+    "breaking_news": {
+        "choices": ["yes", "no", "unclear"],
+        "split": False,
+        "force_lower": True,
+    },
+    "like_a_hollywood_movie": {
+        "choices": ["yes", "no", "unclear"],
+        "split": False,
+        "force_lower": True,
+    },
+    "trustworthy": {
+        "choices": ["yes", "no", "unclear"],
+        "split": False,
+        "force_lower": True,
+    },
+    "economic_impact": {
+        "choices": ["high", "medium", "low", "unclear"],
+        "split": False,
+        "force_lower": True,
+    },
+}
+
+
+def _shape_listing_text(listing: dict) -> str:
+    return shape_article_text(
+        listing["full_text"],
+        model=TEXT_MODEL_SUMMARIZER,
+        max_tokens=TEXT_MODEL_SUMMARIZER_INPUT_MAX_TOKENS,
     )
-    expected_fields = {
-        "summary": {"choices": [], "split": False, "force_lower": False},
-        "keywords": {"choices": [], "split": True, "force_lower": False},
-        "sectors": {"choices": [], "split": True, "force_lower": True},
-        "mood": {
-            "choices": ["positive", "negative", "neutral", "mixed", "unclear"],
-            "split": False,
-            "force_lower": True,
-        },
-        "breaking_news": {
-            "choices": ["yes", "no", "unclear"],
-            "split": False,
-            "force_lower": True,
-        },
-        "like_a_hollywood_movie": {
-            "choices": ["yes", "no", "unclear"],
-            "split": False,
-            "force_lower": True,
-        },
-        "trustworthy": {
-            "choices": ["yes", "no", "unclear"],
-            "split": False,
-            "force_lower": True,
-        },
-        "economic_impact": {
-            "choices": ["high", "medium", "low", "unclear"],
-            "split": False,
-            "force_lower": True,
-        },
-    }
 
+
+def _apply_single_response(listing: dict, response_json: dict, n_input_tokens: int) -> None:
+    formatted_response_json = _parse_gpt_json_response(GPT_EXPECTED_FIELDS, response_json)
+    listing.update({f"gpt_{k}": v for k, v in formatted_response_json.items()})
+    listing["gpt_input_tokens"] = n_input_tokens
+    logger.debug(f"added gpt generated fields title='{listing['title']}'")
+
+
+def _split_tokens(n_tokens: int, weights: list[int]) -> list[int]:
+    """Split `n_tokens` in proportion to the weights (the shares sum up to `n_tokens`)."""
+    total_weight = max(sum(weights), 1)
+    shares, cumulated, previous = [], 0, 0
+    for weight in weights:
+        cumulated += weight
+        share_end = round(n_tokens * cumulated / total_weight)
+        shares.append(share_end - previous)
+        previous = share_end
+    return shares
+
+
+def _apply_batch_response(
+    listings: list[dict], response_json: dict, n_input_tokens: list[int]
+) -> list[int]:
+    """Returns the positions of the listings without a valid result (to retry one by one).
+
+    `n_input_tokens` is the share of the prompt tokens of each listing."""
+    entries = response_json.get("articles", [])
+    results: dict[int, dict] = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            i = int(entry["id"])
+            formatted = _parse_gpt_json_response(GPT_EXPECTED_FIELDS, entry)
+        except Exception as e:
+            logger.warning(f"invalid gpt batch entry: {e!r}")
+            continue
+        if (0 <= i < len(listings)) and (set(formatted) == set(GPT_EXPECTED_FIELDS)):
+            results[i] = formatted
+    for i, formatted in results.items():
+        listings[i].update({f"gpt_{k}": v for k, v in formatted.items()})
+        listings[i]["gpt_input_tokens"] = n_input_tokens[i]
+        listings[i]["gpt_batch_size"] = len(listings)
+    logger.debug(f"added gpt generated fields in batch count={len(results)}/{len(listings)}")
+    return [i for i in range(len(listings)) if i not in results]
+
+
+async def _summarize_single(
+    listing: dict, text: str, semaphore: asyncio.Semaphore, timeout: float
+) -> None:
+    query = GPT_QUERY.format(text=text)
+    try:
+        n_input_tokens = count_tokens(GPT_ROLE + query, model=TEXT_MODEL_SUMMARIZER)
+        async with semaphore:
+            response_json = await asyncio.wait_for(
+                aget_llm_json_response(
+                    gpt_role=GPT_ROLE,
+                    gpt_query=query,
+                    gpt_model=TEXT_MODEL_SUMMARIZER,
+                    gpt_max_tokens=TEXT_MODEL_MAX_TOKENS,
+                    call_site="summarize",
+                    expected_fields=GPT_EXPECTED_FIELDS,
+                ),
+                timeout=timeout,
+            )
+        _apply_single_response(listing, response_json, n_input_tokens)
+    except TimeoutError:
+        logger.warning(f"gpt request timed out after {timeout}s title='{listing['title']}'")
+    except Exception as e:
+        logger.exception(e)
+
+
+async def _summarize_batch(
+    batch: list[tuple[dict, str]], semaphore: asyncio.Semaphore, timeout: float
+) -> None:
+    """Summarize several articles in one request, then retry the failed ones one by one."""
+    listings = [x[0] for x in batch]
+    texts_str = "\n\n".join(f"### ARTICLE id={i}\n{x[1]}" for i, x in enumerate(batch))
+    query = GPT_BATCH_QUERY.format(texts=texts_str)
+    try:
+        # the prompt tokens are shared in proportion to the article texts
+        n_input_tokens = _split_tokens(
+            count_tokens(GPT_ROLE + query, model=TEXT_MODEL_SUMMARIZER),
+            [count_tokens(x[1], model=TEXT_MODEL_SUMMARIZER) for x in batch],
+        )
+        async with semaphore:
+            response_json = await asyncio.wait_for(
+                aget_llm_json_response(
+                    gpt_role=GPT_ROLE,
+                    gpt_query=query,
+                    gpt_model=TEXT_MODEL_SUMMARIZER,
+                    gpt_max_tokens=TEXT_MODEL_MAX_TOKENS * len(batch),
+                    call_site="summarize",
+                    expected_fields={
+                        "articles": {"items": GPT_EXPECTED_FIELDS, "count": len(batch)}
+                    },
+                ),
+                timeout=timeout,
+            )
+        failed = _apply_batch_response(listings, response_json, n_input_tokens)
+    except Exception as e:
+        logger.warning(f"gpt batch request failed (fall back to single requests): {e!r}")
+        failed = list(range(len(batch)))
+    await asyncio.gather(*(_summarize_single(*batch[j], semaphore, timeout) for j in failed))
+
+
+async def add_gpt_info_async(
+    news_listings: list[dict],
+    batch_size: int = TEXT_MODEL_SUMMARIZER_BATCH_SIZE,
+    semaphore: asyncio.Semaphore | None = None,
+    timeout: float = TEXT_MODEL_SUMMARIZER_TIMEOUT_SECONDS,
+) -> None:
+    """Add the gpt summary fields to the listings with full text (concurrent requests).
+
+    Short articles are packed `batch_size` per request; articles without a valid batch
+    result (and long articles) are summarized one by one. The semaphore bounds the number
+    of requests in flight (pass a shared one to bound several concurrent callers), and
+    every request has its own timeout. The listings are updated in place."""
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(TEXT_MODEL_SUMMARIZER_MAX_CONCURRENCY)
+    single: list[tuple[dict, str]] = []
+    batchable: list[tuple[dict, str]] = []
     for listing in news_listings:
         if "full_text" in listing:
-            text = listing["full_text"]
             try:
-                response_json = get_llm_json_response(
-                    gpt_role=gpt_role,
-                    gpt_query=gpt_query.format(text=text),
-                    gpt_model=TEXT_MODEL_SUMMARIZER,
-                    gpt_max_tokens=TEXT_MODEL_MAX_TOKENS,
-                )
-                formatted_response_json = _parse_gpt_json_response(expected_fields, response_json)
-                listing.update({f"gpt_{k}": v for k, v in formatted_response_json.items()})
-                logger.debug(f"added gpt generated fields title='{listing['title']}'")
+                text = _shape_listing_text(listing)
+                n_tokens = count_tokens(text, model=TEXT_MODEL_SUMMARIZER)
             except Exception as e:
                 logger.exception(e)
+                continue
+            if (batch_size > 1) and (n_tokens <= TEXT_MODEL_SUMMARIZER_BATCH_ARTICLE_MAX_TOKENS):
+                batchable.append((listing, text))
+            else:
+                single.append((listing, text))
         else:
             logger.warning(
                 f"no key=full_text to generate gpt fields (skip) title='{listing['title']}'"
             )
+
+    jobs = []
+    for i in range(0, len(batchable), batch_size):
+        batch = batchable[i : i + batch_size]
+        if len(batch) == 1:
+            single.extend(batch)
+        else:
+            jobs.append(_summarize_batch(batch, semaphore, timeout))
+    jobs.extend(_summarize_single(listing, text, semaphore, timeout) for listing, text in single)
+    await asyncio.gather(*jobs)
     logger.info(f"added gpt generated fields count={len(news_listings)}")
+
+
+def add_gpt_info(
+    news_listings: list[dict], batch_size: int = TEXT_MODEL_SUMMARIZER_BATCH_SIZE
+) -> None:
+    """Blocking wrapper around `add_gpt_info_async`."""
+    asyncio.run(add_gpt_info_async(news_listings, batch_size=batch_size))
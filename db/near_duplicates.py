@@ -0,0 +1,176 @@
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from envparse import env
+from loguru import logger
+
+from shared.mongo_utils import get_news_collection
+
+MINHASH_NUM_PERM = 128
+MINHASH_BANDS = 16  # 16 bands x 8 rows: candidate pairs start at ~0.7 jaccard similarity
+MINHASH_SHINGLE_SIZE = 5
+MINHASH_SEED = 42
+NEWS_NEAR_DUPLICATE_THRESHOLD = env.float("NEWS_NEAR_DUPLICATE_THRESHOLD", default=0.8)
+NEWS_NEAR_DUPLICATE_LOOKBACK_DAYS = env.int("NEWS_NEAR_DUPLICATE_LOOKBACK_DAYS", default=7)
+NEWS_NEAR_DUPLICATE_INDEX_MAX_SIZE = env.int("NEWS_NEAR_DUPLICATE_INDEX_MAX_SIZE", default=50_000)
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.default_rng(MINHASH_SEED)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=MINHASH_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=MINHASH_NUM_PERM, dtype=np.uint64)
+_WORD_RE = re.compile(r"\w+")
+
+_lsh_index: "MinHashLSHIndex | None" = None
+_lsh_index_lock = threading.Lock()
+
+
+def compute_minhash(text: str) -> np.ndarray | None:
+    """MinHash signature of the word shingles of the text (None for empty text)."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) == 0:
+        return None
+    n = max(1, len(words) - MINHASH_SHINGLE_SIZE + 1)
+    shingles = {" ".join(words[i : i + MINHASH_SHINGLE_SIZE]) for i in range(n)}
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+    )
+    hashes %= _MERSENNE_PRIME
+    permuted = (_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1)
+
+
+class MinHashLSHIndex:
+    """In-memory LSH index of MinHash signatures with LRU eviction (thread-safe)."""
+
+    def __init__(
+        self, n_bands: int = MINHASH_BANDS, max_size: int = NEWS_NEAR_DUPLICATE_INDEX_MAX_SIZE
+    ):
+        assert MINHASH_NUM_PERM % n_bands == 0
+        self.n_bands = n_bands
+        self.rows = MINHASH_NUM_PERM // n_bands
+        self.max_size = max_size
+        self._buckets: list[dict[bytes, set[str]]] = [{} for _ in range(n_bands)]
+        self._signatures: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def _band_keys(self, signature: np.ndarray) -> list[bytes]:
+        return [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.n_bands)
+        ]
+
+    def _remove(self, key: str) -> None:
+        signature = self._signatures.pop(key)
+        for bucket, band_key in zip(self._buckets, self._band_keys(signature), strict=True):
+            keys = bucket[band_key]
+            keys.discard(key)
+            if len(keys) == 0:
+                del bucket[band_key]
+
+    def add(self, key: str, signature: np.ndarray) -> None:
+        with self._lock:
+            if key in self._signatures:
+                self._remove(key)
+            self._signatures[key] = signature
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature), strict=True):
+                bucket.setdefault(band_key, set()).add(key)
+            while len(self._signatures) > self.max_size:
+                self._remove(next(iter(self._signatures)))
+
+    def query(
+        self, signature: np.ndarray, threshold: float, exclude_key: str | None = None
+    ) -> tuple[str, float] | None:
+        """Return the most similar indexed key (other than `exclude_key`) with estimated
+        jaccard >= threshold."""
+        with self._lock:
+            candidates: set[str] = set()
+            for bucket, band_key in zip(self._buckets, self._band_keys(signature), strict=True):
+                candidates.update(bucket.get(band_key, ()))
+            if exclude_key is not None:
+                candidates.discard(exclude_key)
+            best: tuple[str, float] | None = None
+            for key in candidates:
+                similarity = float(np.mean(self._signatures[key] == signature))
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (key, similarity)
+        return best
+
+
+def get_lsh_index() -> MinHashLSHIndex:
+    """Get the process-wide LSH index, filled with recent stored signatures on first use.
+
+    Only canonical articles with a summary are indexed."""
+    global _lsh_index
+    with _lsh_index_lock:
+        if _lsh_index is None:
+            index = MinHashLSHIndex()
+            from_ = datetime.now(tz=timezone.utc) - timedelta(
+                days=NEWS_NEAR_DUPLICATE_LOOKBACK_DAYS
+            )
+            docs = get_news_collection().find(
+                {
+                    "minhash": {"$exists": True},
+                    "gpt_summary": {"$exists": True},
+                    "duplicate_of": {"$exists": False},
+                    "published_at": {"$gt": from_},
+                },
+                projection={"_id": 0, "url": 1, "minhash": 1},
+                sort=[("published_at", 1)],
+            )
+            for doc in docs:
+                index.add(doc["url"], np.array(doc["minhash"], dtype=np.uint64))
+            _lsh_index = index
+            logger.info(f"loaded near-duplicate index count={len(index)}")
+    return _lsh_index
+
+
+def link_near_duplicates(
+    news_listings: list[dict],
+    threshold: float = NEWS_NEAR_DUPLICATE_THRESHOLD,
+    run_index: MinHashLSHIndex | None = None,
+) -> None:
+    """Add `minhash` to listings with text and link near-duplicates to their canonical article.
+
+    A near-duplicate gets `duplicate_of` (the canonical url) and `duplicate_similarity`.
+    The listings are matched against the saved articles (see `index_saved_article`) and the
+    canonical listings of the same run, which `run_index` collects, so the copies within
+    one GNews batch are not summarized either."""
+
+    index = get_lsh_index()
+    n_duplicates = 0
+    for listing in news_listings:
+        if "full_text" not in listing:
+            continue
+        signature = compute_minhash(listing["full_text"])
+        if signature is None:
+            continue
+        listing["minhash"] = signature.tolist()
+        match = index.query(signature, threshold=threshold, exclude_key=listing["url"])
+        if (match is None) and (run_index is not None):
+            match = run_index.query(signature, threshold=threshold, exclude_key=listing["url"])
+        if match is not None:
+            listing["duplicate_of"], listing["duplicate_similarity"] = match
+            n_duplicates += 1
+            logger.debug(
+                f"near-duplicate title='{listing['title']}' duplicate_of={match[0]} "
+                f"similarity={match[1]:.2f}"
+            )
+        elif run_index is not None:
+            run_index.add(listing["url"], signature)
+    logger.info(f"linked near-duplicate news articles count={n_duplicates}/{len(news_listings)}")
+
+
+def index_saved_article(article: dict) -> None:
+    """Index a saved article as a canonical one (if it has a summary and is not a duplicate).
+
+    Indexing only after the save keeps the listings of a failed run out of the process-wide
+    index, so a retry never links them to an article that was not stored."""
+    if ("minhash" not in article) or ("gpt_summary" not in article) or ("duplicate_of" in article):
+        return
+    get_lsh_index().add(article["url"], np.array(article["minhash"], dtype=np.uint64))
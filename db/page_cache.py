@@ -0,0 +1,147 @@
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+import zstandard
+from envparse import env
+from loguru import logger
+
+from shared.paths import PAGE_CACHE_PATH
+
+NEWS_PAGE_CACHE_ENABLED = env.bool("NEWS_PAGE_CACHE_ENABLED", default=True)
+NEWS_PAGE_CACHE_MAX_BYTES = env.int("NEWS_PAGE_CACHE_MAX_BYTES", default=512 * 1024 * 1024)
+NEWS_PAGE_CACHE_FRESH_SECONDS = env.int("NEWS_PAGE_CACHE_FRESH_SECONDS", default=24 * 3600)
+PAGE_CACHE_ZSTD_LEVEL = 10
+PAGE_CACHE_ITER_CHUNK_SIZE = 100
+
+_page_cache: "PageCache | None" = None
+_page_cache_lock = threading.Lock()
+
+
+@dataclass
+class CachedPage:
+    url: str
+    html: str
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+    def is_fresh(self, fresh_seconds: float = NEWS_PAGE_CACHE_FRESH_SECONDS) -> bool:
+        return time.time() - self.fetched_at < fresh_seconds
+
+    def revalidation_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class PageCache:
+    """Size-bounded LRU cache of downloaded pages in SQLite (zstd-compressed bodies)."""
+
+    def __init__(self, path: Path = PAGE_CACHE_PATH, max_bytes: int = NEWS_PAGE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One transaction on a new connection, which is closed at the end."""
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def get(self, url: str) -> CachedPage | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        body, etag, last_modified, fetched_at = row
+        html = zstandard.ZstdDecompressor().decompress(body).decode("utf-8")
+        return CachedPage(url, html, etag, last_modified, fetched_at)
+
+    def touch(self, url: str) -> None:
+        """Mark a cached page as revalidated (fresh again)."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?", (now, now, url)
+            )
+
+    def put(self, url: str, html: str, etag: str | None, last_modified: str | None) -> None:
+        body = zstandard.ZstdCompressor(level=PAGE_CACHE_ZSTD_LEVEL).compress(html.encode("utf-8"))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO pages
+                    (url, body, size, etag, last_modified, fetched_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (url, body, len(body), etag, last_modified, now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()
+        if total <= self.max_bytes:
+            return
+        n_evicted = 0
+        rows = conn.execute("SELECT url, size FROM pages ORDER BY accessed_at ASC").fetchall()
+        for url, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            n_evicted += 1
+        logger.debug(f"evicted cached pages count={n_evicted} size={total}")
+
+    def iter_pages(self) -> Iterator[tuple[str, str]]:
+        """Iterate over all cached (url, html) pairs in url order (e.g. for parser benchmarks).
+
+        Reads the pages in chunks, so no transaction stays open while the caller iterates."""
+        decompressor = zstandard.ZstdDecompressor()
+        last_url = ""
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT url, body FROM pages WHERE url > ? ORDER BY url LIMIT ?",
+                    (last_url, PAGE_CACHE_ITER_CHUNK_SIZE),
+                ).fetchall()
+            if len(rows) == 0:
+                return
+            for url, body in rows:
+                yield url, decompressor.decompress(body).decode("utf-8")
+            last_url = rows[-1][0]
+
+
+def get_page_cache() -> PageCache | None:
+    """Get the process-wide page cache (None if disabled)."""
+    global _page_cache
+    if not NEWS_PAGE_CACHE_ENABLED:
+        return None
+    with _page_cache_lock:
+        if _page_cache is None:
+            _page_cache = PageCache()
+            logger.info(f"opened page cache path={_page_cache.path}")
+    return _page_cache
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+from envparse import env
+from loguru import logger
+
+from db.page_cache import PageCache, get_page_cache
+
+NEWS_DOWNLOAD_MAX_CONCURRENCY = env.int("NEWS_DOWNLOAD_MAX_CONCURRENCY", default=10)
+NEWS_DOWNLOAD_MAX_PER_HOST = env.int("NEWS_DOWNLOAD_MAX_PER_HOST", default=2)
+NEWS_DOWNLOAD_HOST_DELAY_SECONDS = env.float("NEWS_DOWNLOAD_HOST_DELAY_SECONDS", default=0.5)
+NEWS_DOWNLOAD_TIMEOUT_SECONDS = env.float("NEWS_DOWNLOAD_TIMEOUT_SECONDS", default=20.0)
+NEWS_DOWNLOAD_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/126.0 Safari/537.36"
+)
+
+
+class _ProcessSemaphore:
+    """Semaphore shared by the event loops of all threads (each `load_news` runs its own loop).
+
+    Waiters are woken in FIFO order on their own loop."""
+
+    def __init__(self, value: int):
+        self._value = value
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._value > 0 and len(self._waiters) == 0:
+                self._value -= 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if (loop, future) in self._waiters:
+                    self._waiters.remove((loop, future))
+                    raise
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over before the cancellation
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            while len(self._waiters) > 0:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._hand_over, future)
+                except RuntimeError:  # the waiter's loop is closed
+                    continue
+                return
+            self._value += 1
+
+    def _hand_over(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()  # the waiter gave up after it was picked, pass the slot on
+        else:
+            future.set_result(None)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+
+class _HostLimiter:
+    """Per-host politeness: cap in-flight requests and space out request starts (process-wide)."""
+
+    def __init__(self, max_per_host: int, delay_seconds: float):
+        self.max_per_host = max_per_host
+        self.delay_seconds = delay_seconds
+        self._semaphores: dict[str, _ProcessSemaphore] = {}
+        self._next_start: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, _ProcessSemaphore(self.max_per_host))
+        async with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start_at = max(now, self._next_start.get(host, 0.0))
+                self._next_start[host] = start_at + self.delay_seconds
+            if start_at > now:
+                await asyncio.sleep(start_at - now)
+            yield
+
+
+_host_limiter = _HostLimiter(
+    max_per_host=NEWS_DOWNLOAD_MAX_PER_HOST, delay_seconds=NEWS_DOWNLOAD_HOST_DELAY_SECONDS
+)
+_download_semaphore = _ProcessSemaphore(NEWS_DOWNLOAD_MAX_CONCURRENCY)
+
+
+class PageDownloader:
+    """Async client used as an async context manager.
+
+    The global and per-host download limits are shared by all downloaders of the process, so
+    concurrent queries do not multiply them."""
+
+    def __init__(
+        self,
+        max_concurrency: int = NEWS_DOWNLOAD_MAX_CONCURRENCY,
+        cache: PageCache | None = None,
+    ):
+        self._cache = cache if cache is not None else get_page_cache()
+        limits = httpx.Limits(
+            max_connections=max_concurrency, max_keepalive_connections=max_concurrency
+        )
+        self._client = httpx.AsyncClient(
+            headers={"User-Agent": NEWS_DOWNLOAD_USER_AGENT},
+            timeout=NEWS_DOWNLOAD_TIMEOUT_SECONDS,
+            limits=limits,
+            follow_redirects=True,
+        )
+
+    async def __aenter__(self) -> "PageDownloader":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+
+    async def download(self, url: str) -> str | None:
+        """Download one page (None if the download failed).
+
+        Fresh cached pages are served without a request, stale ones are revalidated with
+        their ETag/Last-Modified validators."""
+        cached = None
+        if self._cache is not None:
+            cached = await asyncio.to_thread(self._cache.get, url)
+            if cached is not None and cached.is_fresh():
+                logger.debug(f"page cache hit {url=}")
+                return cached.html
+        headers = cached.revalidation_headers() if cached is not None else {}
+        host = urlsplit(url).netloc.lower()
+        async with _host_limiter.slot(host), _download_semaphore:
+            try:
+                response = await self._client.get(url, headers=headers)
+                if response.status_code == httpx.codes.NOT_MODIFIED and cached is not None:
+                    logger.debug(f"page not modified {url=}")
+                    await asyncio.to_thread(self._cache.touch, url)
+                    return cached.html
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                if cached is not None:
+                    logger.warning(f"failed to revalidate page {url=}, using cached copy: {e!r}")
+                    return cached.html
+                logger.warning(f"failed to download page {url=}: {e!r}")
+                return None
+        logger.debug(f"downloaded page {url=} size={len(response.content)}")
+        if self._cache is not None:
+            await asyncio.to_thread(
+                self._cache.put,
+                url,
+                response.text,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+            )
+        return response.text
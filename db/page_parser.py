@@ -0,0 +1,120 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from envparse import env
+from loguru import logger
+
+NEWS_PARSE_WORKERS = env.int("NEWS_PARSE_WORKERS", default=os.cpu_count() or 1)
+NEWS_PARSE_NLP = env.bool("NEWS_PARSE_NLP", default=False)
+
+_parse_executor: ProcessPoolExecutor | None = None
+_parse_executor_lock = threading.Lock()
+_nltk_data_checked = False
+
+NLTK_RESOURCES = ["tokenizers/punkt", "tokenizers/punkt_tab"]
+
+
+def ensure_nltk_data() -> None:
+    """Check that the NLTK data needed by `nlp()` is available locally (never downloads).
+
+    Fails fast with a clear message instead of hitting the network at runtime."""
+    global _nltk_data_checked
+    if _nltk_data_checked:
+        return
+    import nltk
+
+    missing = []
+    for resource in NLTK_RESOURCES:
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            missing.append(resource)
+    if len(missing) > 0:
+        raise RuntimeError(
+            f"missing local NLTK data {missing} (search path: {nltk.data.path}); "
+            "install it with `python -m nltk.downloader punkt punkt_tab` or disable NEWS_PARSE_NLP"
+        )
+    _nltk_data_checked = True
+    logger.debug("found local NLTK data")
+
+
+def parse_page(url: str, html: str, run_nlp: bool) -> dict:
+    """Parse a downloaded page with newspaper (CPU-bound, runs in a worker process).
+
+    The raw html is not sent back, the caller already has it."""
+    import newspaper
+
+    page = newspaper.Article(url)
+    page.download(input_html=html)
+    page.parse()
+    fields = {"full_text": page.text, "tags": list(page.tags)}
+    if run_nlp:
+        page.nlp()
+        fields["nltk_summary"] = page.summary
+        fields["nltk_keywords"] = page.keywords
+    return fields
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Get or create the process pool for the parse stage (one per process).
+
+    The workers start from a forkserver: the pool is created lazily in a worker thread
+    while the Mongo, Prefect and loguru threads run, where forking can deadlock."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=NEWS_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+            logger.info(f"started page parser pool workers={NEWS_PARSE_WORKERS}")
+    return _parse_executor
+
+
+def _reset_parse_executor(broken: ProcessPoolExecutor) -> None:
+    """Drop a broken pool (a worker crashed), the next call starts a new one.
+
+    Only the pool that broke is dropped: a concurrent caller may already have replaced it."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is broken:
+            _parse_executor = None
+            logger.warning("page parser pool is broken (a worker crashed), restarting it")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def _shutdown_parse_executor() -> None:
+    with _parse_executor_lock:
+        if _parse_executor is not None:
+            _parse_executor.shutdown(cancel_futures=True)
+
+
+async def parse_page_async(url: str, html: str, run_nlp: bool = NEWS_PARSE_NLP) -> dict | None:
+    """Parse one page in the process pool without blocking the event loop.
+
+    If a worker crashed, the pool is restarted and the page parsed once more.
+    Returns the parsed fields (None if the parsing failed)."""
+    if run_nlp:
+        ensure_nltk_data()
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_parse_executor()
+        try:
+            fields = await loop.run_in_executor(executor, parse_page, url, html, run_nlp)
+            break
+        except BrokenProcessPool as e:
+            _reset_parse_executor(executor)
+            if attempt == 1:
+                logger.warning(f"failed to parse page {url=}: {e!r}")
+                return None
+        except Exception as e:
+            logger.warning(f"failed to parse page {url=}: {e!r}")
+            return None
+    fields["full_html"] = html
+    return fields
@@ -0,0 +1,88 @@
+import re
+from functools import lru_cache
+from typing import Any
+
+from loguru import logger
+
+# anchored, so that article sentences mentioning a newsletter, cookies, etc. are kept
+BOILERPLATE_PATTERNS = [
+    r"^advertisement$",
+    r"^(sign up|subscribe)\b",
+    r"^(get|join|read|receive)( our| the)?( free| daily| weekly)? newsletters?\b",
+    r"^(we|this (web)?site|our (web)?site) uses? cookies\b",
+    r"^(accept|manage|reject)( all)? cookies\b",
+    r"^share( this( article| story)?| on \w+)?$",
+    r"^(follow us|read more)\b",
+    r"^(related|recommended|most popular|trending)( articles| stories| news)?:?$",
+    r"\ball rights reserved\.?$",
+    r"^(click|tap) here\b",
+    r"^(image|photo|video)( credit| source)?:",
+    r"^(please )?(enable|turn on) javascript\b",
+    r"^javascript (is )?(disabled|required)\b",
+]
+_BOILERPLATE_RE = re.compile("|".join(f"(?:{p})" for p in BOILERPLATE_PATTERNS), re.IGNORECASE)
+_SENTENCE_END_RE = re.compile(r"[.!?\"'”)]$")
+MIN_PARAGRAPH_WORDS = 8  # shorter lines without a sentence ending are treated as navigation
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str) -> Any:
+    """Tiktoken encoding of the model (o200k_base for unknown models).
+
+    The encoding files are baked into the db image (TIKTOKEN_CACHE_DIR): tiktoken would
+    download them on first use otherwise."""
+    import tiktoken
+
+    try:
+        encoding_name = tiktoken.encoding_name_for_model(model.split("/")[-1])
+    except KeyError:
+        encoding_name = "o200k_base"
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        raise RuntimeError(
+            f"failed to load tiktoken encoding {encoding_name} for {model=}: {e!r}; "
+            "pre-fetch it into TIKTOKEN_CACHE_DIR (see db/Dockerfile)"
+        ) from e
+
+
+def count_tokens(text: str, model: str) -> int:
+    return len(_get_encoding(model).encode(text, disallowed_special=()))
+
+
+def _is_boilerplate(paragraph: str) -> bool:
+    if _BOILERPLATE_RE.search(paragraph):
+        return True
+    n_words = len(paragraph.split())
+    return n_words < MIN_PARAGRAPH_WORDS and not _SENTENCE_END_RE.search(paragraph)
+
+
+def clean_article_text(text: str) -> str:
+    """Drop boilerplate and repeated paragraphs, keeping the paragraph order."""
+    seen: set[str] = set()
+    paragraphs = []
+    for paragraph in text.split("\n"):
+        paragraph = paragraph.strip()
+        if len(paragraph) == 0 or _is_boilerplate(paragraph):
+            continue
+        key = " ".join(paragraph.lower().split())
+        if key in seen:
+            continue
+        seen.add(key)
+        paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def shape_article_text(text: str, model: str, max_tokens: int) -> str:
+    """Clean the article text and truncate it to at most `max_tokens` tokens of the model."""
+    cleaned = clean_article_text(text)
+    encoding = _get_encoding(model)
+    tokens = encoding.encode(cleaned, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return cleaned
+    truncated = encoding.decode(tokens[:max_tokens])
+    cut = truncated.rfind("\n\n")
+    if cut > len(truncated) // 2:  # prefer to cut on a paragraph boundary
+        truncated = truncated[:cut]
+    logger.debug(f"truncated article text tokens={len(tokens)} max_tokens={max_tokens}")
+    return truncated
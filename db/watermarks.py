@@ -0,0 +1,31 @@
+from datetime import datetime, timezone
+
+from loguru import logger
+
+from shared.mongo_utils import get_watermarks_collection
+
+
+def get_watermark(query: str, source: str) -> datetime | None:
+    """Get the newest published_at successfully ingested for the query and source."""
+    doc = get_watermarks_collection().find_one(
+        {"query": query, "source": source}, projection={"_id": 0, "published_at": 1}
+    )
+    if doc is None:
+        return None
+    watermark: datetime = doc["published_at"]
+    if watermark.tzinfo is None:
+        watermark = watermark.replace(tzinfo=timezone.utc)
+    return watermark
+
+
+def advance_watermark(query: str, source: str, published_at: datetime) -> None:
+    """Move the watermark forward (never backward) after a successful ingestion."""
+    get_watermarks_collection().update_one(
+        {"query": query, "source": source},
+        {
+            "$max": {"published_at": published_at},
+            "$set": {"updated_at": datetime.now(tz=timezone.utc)},
+        },
+        upsert=True,
+    )
+    logger.debug(f"advanced watermark {query=} {source=} published_at={published_at}")
@@ -0,0 +1,61 @@
+"""
+Incremental parsing of a streamed JSON object, one top-level field at a time.
+"""
+
+import json
+from typing import Any
+
+
+class JSONObjectStreamParser:
+    """Feed the text chunks of a JSON object and get its top-level fields as they complete.
+
+    A field is complete once the `,` or `}` after its value arrives, so string and nested
+    values are returned whole and parsed by `json.loads`."""
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start: int | None = None
+        self.fields: dict[str, Any] = {}
+        self.done = False
+
+    def feed(self, chunk: str) -> list[tuple[str, Any]]:
+        """Add a chunk of text; returns the fields completed by it (in order)."""
+        self._buffer += chunk
+        completed = []
+        while self._pos < len(self._buffer) and not self.done:
+            char = self._buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._member_start = self._pos + 1
+            elif char in "}]" or (char == "," and self._depth == 1):
+                if self._depth == 1 and self._member_start is not None:
+                    member = self._buffer[self._member_start : self._pos]
+                    if len(member.strip()) > 0:
+                        completed.extend(json.loads("{" + member + "}").items())
+                    self._member_start = self._pos + 1
+                if char != ",":
+                    self._depth -= 1
+                    self.done = self._depth == 0
+            self._pos += 1
+        self.fields.update(completed)
+        return completed
+
+    def close(self) -> dict[str, Any]:
+        """Return all the fields, failing if the object is incomplete."""
+        if not self.done:
+            raise json.JSONDecodeError("unterminated JSON object", self._buffer, self._pos)
+        return self.fields
@@ -0,0 +1,142 @@
+"""
+Persistent content-addressed cache of LLM JSON responses (shared by the db and web ETLs).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import closing, contextmanager
+from pathlib import Path
+
+from envparse import env
+from loguru import logger
+
+from shared.paths import LLM_CACHE_PATH
+
+LLM_CACHE_ENABLED = env.bool("LLM_CACHE_ENABLED", default=True)
+LLM_CACHE_TTL_SECONDS = env.int("LLM_CACHE_TTL_SECONDS", default=30 * 24 * 3600)
+LLM_CACHE_MAX_BYTES = env.int("LLM_CACHE_MAX_BYTES", default=256 * 1024 * 1024)
+
+_llm_cache: "LLMResponseCache | None" = None
+_llm_cache_lock = threading.Lock()
+
+
+def llm_cache_key(model: str, messages: list[dict], temperature: float, max_tokens: int) -> str:
+    """Hash of everything that determines the completion."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite cache of JSON responses with TTL and size-bounded LRU eviction (thread-safe)."""
+
+    def __init__(
+        self,
+        path: Path = LLM_CACHE_PATH,
+        ttl_seconds: int = LLM_CACHE_TTL_SECONDS,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._counters_lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """One transaction on a new connection, which is closed at the end."""
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            yield conn
+
+    def _count(self, hit: bool) -> None:
+        with self._counters_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count(hit=row is not None)
+        return json.loads(row[0]) if row is not None else None
+
+    def put(self, key: str, model: str, response_json: dict) -> None:
+        response = json.dumps(response_json, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO responses
+                    (key, model, response, size, created_at, accessed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)""",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        (total,) = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        n_evicted = 0
+        rows = conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            n_evicted += 1
+        logger.debug(f"evicted cached llm responses count={n_evicted} size={total}")
+
+    def stats(self) -> dict[str, int]:
+        with self._counters_lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """Get the process-wide LLM response cache (None if disabled)."""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMResponseCache()
+            logger.info(f"opened llm response cache path={_llm_cache.path}")
+    return _llm_cache
@@ -0,0 +1,217 @@
+"""
+Deterministic local stand-in for the LLM and image APIs (LLM_BACKEND=local), for offline
+benchmarks and load tests: schema-valid JSON, placeholder PNGs, synthetic latency and errors.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import struct
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+from typing import Any
+
+from envparse import env
+
+LOCAL_LLM_LATENCY_SECONDS = env.float("LOCAL_LLM_LATENCY_SECONDS", default=0.5)
+LOCAL_LLM_LATENCY_SIGMA = env.float("LOCAL_LLM_LATENCY_SIGMA", default=0.5)
+LOCAL_LLM_TOKENS_PER_SECOND = env.float("LOCAL_LLM_TOKENS_PER_SECOND", default=100.0)
+LOCAL_LLM_ERROR_RATE = env.float("LOCAL_LLM_ERROR_RATE", default=0.0)
+LOCAL_LLM_SEED = env.int("LOCAL_LLM_SEED", default=0)
+LOCAL_IMAGE_LATENCY_SECONDS = env.float("LOCAL_IMAGE_LATENCY_SECONDS", default=5.0)
+LOCAL_STREAM_CHUNK_CHARS = 16
+
+_WORDS = [
+    "the",
+    "ancient",
+    "stars",
+    "align",
+    "over",
+    "the",
+    "sleeping",
+    "city",
+    "while",
+    "whispers",
+    "rise",
+    "from",
+    "the",
+    "deep",
+    "and",
+    "scholars",
+    "record",
+    "strange",
+    "dreams",
+    "of",
+    "sunken",
+    "temples",
+    "beneath",
+    "a",
+    "pale",
+    "green",
+    "sky",
+]
+
+_rng = random.Random(LOCAL_LLM_SEED)
+_rng_lock = threading.Lock()
+
+
+class LocalBackendError(Exception):
+    """Synthetic API error; `status_code` and `response.headers` look like a litellm error."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"synthetic local backend error status_code={status_code}")
+        self.status_code = status_code
+        headers = {"retry-after": "1"} if status_code == 429 else {}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def _text(seed: int, n_words: int) -> str:
+    rng = random.Random(seed)
+    words = [rng.choice(_WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def fake_json_response(expected_fields: dict, seed: int) -> dict:
+    """A response that passes the `*_expected_json_fields` checks.
+
+    Fields with `votes`/`choices` get one of them, `split` fields a comma-separated list,
+    `items` fields a list of `count` objects (with an `id`), other fields a sentence."""
+    response: dict[str, Any] = {}
+    for i, (field, conditions) in enumerate(expected_fields.items()):
+        field_seed = seed + i
+        choices = conditions.get("votes") or conditions.get("choices")
+        if "items" in conditions:
+            response[field] = [
+                {"id": j, **fake_json_response(conditions["items"], field_seed * 31 + j)}
+                for j in range(conditions["count"])
+            ]
+        elif choices:
+            response[field] = random.Random(field_seed).choice(choices)
+        elif conditions.get("is_int", False):
+            response[field] = random.Random(field_seed).randint(0, 10)
+        elif conditions.get("is_bool", False):
+            response[field] = random.Random(field_seed).random() < 0.5
+        elif conditions.get("split", False):
+            response[field] = ", ".join(random.Random(field_seed).sample(_WORDS, 3))
+        else:
+            response[field] = _text(field_seed, n_words=40)
+    return response
+
+
+def _seed(*parts: Any) -> int:
+    digest = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _draw_latency_and_error(median_seconds: float) -> tuple[float, int | None]:
+    with _rng_lock:
+        latency = median_seconds * math.exp(_rng.gauss(0, LOCAL_LLM_LATENCY_SIGMA))
+        failed = _rng.random() < LOCAL_LLM_ERROR_RATE
+        status_code = _rng.choice([429, 500, 503]) if failed else None
+    return latency, status_code
+
+
+def _usage(messages: list[dict], content: str) -> SimpleNamespace:
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+    )
+
+
+def _completion_content(model: str, messages: list[dict], expected_fields: dict | None) -> str:
+    seed = _seed(model, messages)
+    return json.dumps(fake_json_response(expected_fields or {}, seed))
+
+
+def _model_response(content: str, messages: list[dict]) -> SimpleNamespace:
+    message = SimpleNamespace(role="assistant", content=content)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")],
+        usage=_usage(messages, content),
+        _hidden_params={"response_cost": 0.0},
+    )
+
+
+def completion(
+    model: str, messages: list[dict], expected_fields: dict | None = None, **kwargs
+) -> SimpleNamespace:
+    content = _completion_content(model, messages, expected_fields)
+    latency, status_code = _draw_latency_and_error(LOCAL_LLM_LATENCY_SECONDS)
+    time.sleep(latency + len(content) / 4 / LOCAL_LLM_TOKENS_PER_SECOND)
+    if status_code is not None:
+        raise LocalBackendError(status_code)
+    return _model_response(content, messages)
+
+
+async def _stream(content: str, messages: list[dict]) -> AsyncIterator[SimpleNamespace]:
+    for i in range(0, len(content), LOCAL_STREAM_CHUNK_CHARS):
+        piece = content[i : i + LOCAL_STREAM_CHUNK_CHARS]
+        await asyncio.sleep(len(piece) / 4 / LOCAL_LLM_TOKENS_PER_SECOND)
+        delta = SimpleNamespace(role="assistant", content=piece)
+        yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta)], usage=None)
+    yield SimpleNamespace(choices=[], usage=_usage(messages, content))
+
+
+async def acompletion(
+    model: str,
+    messages: list[dict],
+    expected_fields: dict | None = None,
+    stream: bool = False,
+    **kwargs,
+) -> Any:
+    content = _completion_content(model, messages, expected_fields)
+    latency, status_code = _draw_latency_and_error(LOCAL_LLM_LATENCY_SECONDS)
+    await asyncio.sleep(latency)
+    if status_code is not None:
+        raise LocalBackendError(status_code)
+    if stream:
+        return _stream(content, messages)
+    await asyncio.sleep(len(content) / 4 / LOCAL_LLM_TOKENS_PER_SECOND)
+    return _model_response(content, messages)
+
+
+def placeholder_png(width: int, height: int, seed: int) -> bytes:
+    """A solid-color RGB PNG (the color depends on the seed)."""
+    color = bytes(random.Random(seed).randrange(256) for _ in range(3))
+    raw = (b"\x00" + color * width) * height
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(raw, 9))
+        + chunk(b"IEND", b"")
+    )
+
+
+def image_generation(
+    model: str, prompt: str, size: str = "1024x1024", n: int = 1, **kwargs
+) -> SimpleNamespace:
+    latency, status_code = _draw_latency_and_error(LOCAL_IMAGE_LATENCY_SECONDS)
+    time.sleep(latency)
+    if status_code is not None:
+        raise LocalBackendError(status_code)
+    width, height = (int(x) for x in size.split("x"))
+    seed = _seed(model, prompt)
+    data = [
+        SimpleNamespace(
+            b64_json=base64.b64encode(placeholder_png(width, height, seed + i)).decode("ascii"),
+            revised_prompt=prompt,
+            url=None,
+        )
+        for i in range(n)
+    ]
+    return SimpleNamespace(data=data, usage=None, _hidden_params={"response_cost": 0.0})
@@ -0,0 +1,209 @@
+"""
+Telemetry of the LLM and image API calls: latency, tokens, cost, cache hits and retries per
+call site and model, exposed as Prometheus metrics and as per-flow-run aggregates.
+"""
+
+import functools
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, ParamSpec, TypeVar
+
+from envparse import env
+from loguru import logger
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+LLM_METRICS_TEXTFILE_PATH = env.str("LLM_METRICS_TEXTFILE_PATH", default="")
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+@dataclass
+class LLMCall:
+    """One API call, filled in by the caller while it runs."""
+
+    call_site: str
+    model: str
+    start: float = field(default_factory=time.monotonic)
+    latency_seconds: float = 0.0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    cache_hit: bool = False
+    retries: int = 0
+    error: bool = False
+
+    def count_retry(self) -> None:
+        self.retries += 1
+
+    def add_usage(self, response: Any) -> None:
+        """Take the token counts and the cost from a litellm response (if it has them)."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            self.cached_prompt_tokens += getattr(details, "cached_tokens", 0) or 0
+            self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        hidden_params = getattr(response, "_hidden_params", None) or {}
+        self.cost_usd += hidden_params.get("response_cost") or 0.0
+
+
+@dataclass
+class LLMCallStats:
+    calls: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    latency_seconds: float = 0.0
+    latency_buckets: list[int] = field(default_factory=lambda: [0] * len(LATENCY_BUCKETS))
+
+    def add(self, call: LLMCall) -> None:
+        self.calls += 1
+        self.errors += call.error
+        self.cache_hits += call.cache_hit
+        self.retries += call.retries
+        self.prompt_tokens += call.prompt_tokens
+        self.cached_prompt_tokens += call.cached_prompt_tokens
+        self.completion_tokens += call.completion_tokens
+        self.cost_usd += call.cost_usd
+        self.latency_seconds += call.latency_seconds
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if call.latency_seconds <= bound:
+                self.latency_buckets[i] += 1
+
+
+class LLMUsage:
+    """Aggregated calls by (call site, model) (thread-safe)."""
+
+    def __init__(self):
+        self._stats: dict[tuple[str, str], LLMCallStats] = {}
+        self._lock = threading.Lock()
+
+    def add(self, call: LLMCall) -> None:
+        with self._lock:
+            self._stats.setdefault((call.call_site, call.model), LLMCallStats()).add(call)
+
+    def snapshot(self) -> dict[tuple[str, str], LLMCallStats]:
+        with self._lock:
+            return {
+                k: LLMCallStats(**{**vars(v), "latency_buckets": list(v.latency_buckets)})
+                for k, v in self._stats.items()
+            }
+
+    def summary(self) -> str:
+        lines = []
+        for (call_site, model), s in sorted(self.snapshot().items()):
+            lines.append(
+                f"{call_site} model={model} calls={s.calls} errors={s.errors} "
+                f"cache_hits={s.cache_hits} retries={s.retries} "
+                f"latency={s.latency_seconds:.2f}s prompt_tokens={s.prompt_tokens} "
+                f"cached_prompt_tokens={s.cached_prompt_tokens} "
+                f"completion_tokens={s.completion_tokens} cost=${s.cost_usd:.4f}"
+            )
+        return "\n".join(lines)
+
+
+_process_usage = LLMUsage()
+_run_usage: ContextVar[LLMUsage | None] = ContextVar("llm_run_usage", default=None)
+
+
+def get_process_llm_usage() -> LLMUsage:
+    return _process_usage
+
+
+@contextmanager
+def track_llm_call(call_site: str, model: str) -> Iterator[LLMCall]:
+    """Time the API call in the block and record it (also when it fails)."""
+    call = LLMCall(call_site=call_site, model=model)
+    try:
+        yield call
+    except GeneratorExit:  # the caller stopped reading a streamed response early
+        raise
+    except BaseException:
+        call.error = True
+        raise
+    finally:
+        call.latency_seconds = time.monotonic() - call.start
+        _process_usage.add(call)
+        run_usage = _run_usage.get()
+        if run_usage is not None:
+            run_usage.add(call)
+
+
+def track_llm_usage(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Aggregate the calls made during each run of the decorated (flow) function.
+
+    The aggregate is logged when the run ends; the process metrics are also written to
+    LLM_METRICS_TEXTFILE_PATH (if set) for a Prometheus textfile collector."""
+
+    def decorator(fn: Callable[P, R]) -> Callable[P, R]:
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            usage = LLMUsage()
+            token = _run_usage.set(usage)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _run_usage.reset(token)
+                summary = usage.summary()
+                logger.info(f"llm usage of {name}:\n{summary or 'no calls'}")
+                if LLM_METRICS_TEXTFILE_PATH:
+                    write_prometheus_textfile(Path(LLM_METRICS_TEXTFILE_PATH))
+
+        return wrapper
+
+    return decorator
+
+
+def _labels(call_site: str, model: str, **extra: str) -> str:
+    labels = {"call_site": call_site, "model": model, **extra}
+    return ",".join(f'{k}="{v}"' for k, v in labels.items())
+
+
+def render_prometheus_metrics(usage: LLMUsage | None = None) -> str:
+    """Render the (process) usage in the Prometheus text exposition format."""
+    stats = (usage or _process_usage).snapshot()
+    counters = [
+        ("llm_calls_total", "API calls.", "calls"),
+        ("llm_call_errors_total", "Failed API calls.", "errors"),
+        ("llm_cache_hits_total", "Calls answered from the response cache.", "cache_hits"),
+        ("llm_retries_total", "Retried API requests.", "retries"),
+        ("llm_prompt_tokens_total", "Prompt tokens.", "prompt_tokens"),
+        (
+            "llm_cached_prompt_tokens_total",
+            "Prompt tokens served from the provider prompt cache.",
+            "cached_prompt_tokens",
+        ),
+        ("llm_completion_tokens_total", "Completion tokens.", "completion_tokens"),
+        ("llm_cost_usd_total", "Estimated cost in USD.", "cost_usd"),
+    ]
+    lines = []
+    for metric, help_text, attr in counters:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for (call_site, model), s in sorted(stats.items()):
+            lines.append(f"{metric}{{{_labels(call_site, model)}}} {getattr(s, attr)}")
+    metric = "llm_call_latency_seconds"
+    lines += [f"# HELP {metric} Wall latency of the API calls.", f"# TYPE {metric} histogram"]
+    for (call_site, model), s in sorted(stats.items()):
+        for bound, count in zip(LATENCY_BUCKETS, s.latency_buckets, strict=True):
+            lines.append(f"{metric}_bucket{{{_labels(call_site, model, le=str(bound))}}} {count}")
+        lines.append(f"{metric}_bucket{{{_labels(call_site, model, le='+Inf')}}} {s.calls}")
+        lines.append(f"{metric}_sum{{{_labels(call_site, model)}}} {s.latency_seconds}")
+        lines.append(f"{metric}_count{{{_labels(call_site, model)}}} {s.calls}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: Path) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(render_prometheus_metrics())
+    tmp_path.replace(path)
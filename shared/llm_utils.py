@@ -1,11 +1,103 @@
+import asyncio
 import json
+from collections.abc import AsyncIterator
+from types import ModuleType
+from typing import Any
 
-import litellm
+import httpx
+from envparse import env
 from loguru import logger
 
+from shared.json_stream import JSONObjectStreamParser
+from shared.llm_cache import LLMResponseCache, get_llm_cache, llm_cache_key
+from shared.llm_telemetry import LLMCall, track_llm_call
+from shared.rate_limit import (
+    LLM_RATE_LIMIT_RPM,
+    LLM_RATE_LIMIT_TPM,
+    TokenBucketLimiter,
+    acall_with_rate_limit,
+    call_with_rate_limit,
+    get_rate_limiter,
+)
 
-# @retry(stop=stop_after_attempt(2), wait=wait_fixed(1.0))
-def get_llm_json_response(
+LLM_HTTP_MAX_CONNECTIONS = env.int("LLM_HTTP_MAX_CONNECTIONS", default=20)
+LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS = env.float("LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS", default=60.0)
+LLM_HTTP_TIMEOUT_SECONDS = env.float("LLM_HTTP_TIMEOUT_SECONDS", default=120.0)
+LLM_BACKEND = env.str("LLM_BACKEND", default="litellm")  # litellm or local (offline stand-in)
+
+_litellm: ModuleType | None = None
+
+
+def _llm_http_client_kwargs() -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "timeout": LLM_HTTP_TIMEOUT_SECONDS,
+    }
+
+
+def get_litellm() -> ModuleType:
+    """Import litellm on first use (the import alone takes seconds).
+
+    The sync calls of all threads share one keep-alive connection pool."""
+    global _litellm
+    if _litellm is None:
+        import litellm
+
+        if litellm.client_session is None:
+            litellm.client_session = httpx.Client(**_llm_http_client_kwargs())
+        _litellm = litellm
+    return _litellm
+
+
+def get_llm_backend() -> ModuleType:
+    """The module serving the completion and image calls (litellm or the local stand-in)."""
+    if LLM_BACKEND == "litellm":
+        return get_litellm()
+    elif LLM_BACKEND == "local":
+        import shared.llm_local
+
+        return shared.llm_local
+    raise ValueError(f"unknown {LLM_BACKEND=}")
+
+
+def _backend_kwargs(completion_kwargs: dict, expected_fields: dict | None) -> dict:
+    """The local stand-in needs the expected response fields to return a valid JSON."""
+    if LLM_BACKEND == "local":
+        return {**completion_kwargs, "expected_fields": expected_fields}
+    return completion_kwargs
+
+
+def image_generation(**kwargs) -> Any:
+    return get_llm_backend().image_generation(**kwargs)
+
+
+async def open_llm_http_pool() -> None:
+    """Share one keep-alive connection pool between the async calls of the running loop.
+
+    Call it at the startup of a long-lived event loop (e.g. the web app lifespan). The pool
+    is bound to that loop, so short-lived `asyncio.run` loops should not open it."""
+    if LLM_BACKEND != "litellm":
+        return
+    litellm = get_litellm()
+    if litellm.aclient_session is None:
+        litellm.aclient_session = httpx.AsyncClient(**_llm_http_client_kwargs())
+        logger.info(f"opened llm http pool max_connections={LLM_HTTP_MAX_CONNECTIONS}")
+
+
+async def close_llm_http_pool() -> None:
+    if LLM_BACKEND != "litellm":
+        return
+    litellm = get_litellm()
+    if litellm.aclient_session is not None:
+        await litellm.aclient_session.aclose()
+        litellm.aclient_session = None
+
+
+def _completion_kwargs(
     gpt_role: str,
     gpt_query: str,
     gpt_model: str,
@@ -16,16 +108,180 @@ def get_llm_json_response(
         {"role": "user", "content": gpt_query},
     ]
     logger.debug(f"prompt_length={len(gpt_query)} model={gpt_model} max_tokens={gpt_max_tokens}")
-    response = litellm.completion(
-        model=gpt_model,  # Can be "gpt-4", "claude-3-opus", "gemini-pro", etc.
-        messages=gpt_messages,  # type: ignore
-        stream=False,
-        max_tokens=gpt_max_tokens,
-        n=1,
-        stop=None,
-        frequency_penalty=0,
-        temperature=0.5,
-        response_format={"type": "json_object"},
+    return {
+        "model": gpt_model,  # Can be "gpt-4", "claude-3-opus", "gemini-pro", etc.
+        "messages": gpt_messages,
+        "stream": False,
+        "max_tokens": gpt_max_tokens,
+        "n": 1,
+        "stop": None,
+        "frequency_penalty": 0,
+        "temperature": 0.5,
+        "response_format": {"type": "json_object"},
+    }
+
+
+def _get_cache(use_cache: bool) -> LLMResponseCache | None:
+    """The response cache, never used with the local stand-in: its fake responses would be
+    served for real prompts later (and cached real responses would skip its latency)."""
+    if (not use_cache) or (LLM_BACKEND == "local"):
+        return None
+    return get_llm_cache()
+
+
+def _cache_key(completion_kwargs: dict) -> str:
+    return llm_cache_key(
+        model=completion_kwargs["model"],
+        messages=completion_kwargs["messages"],
+        temperature=completion_kwargs["temperature"],
+        max_tokens=completion_kwargs["max_tokens"],
+    )
+
+
+def _rate_limit(completion_kwargs: dict) -> tuple[TokenBucketLimiter, int]:
+    """Limiter of the model and the tokens the call counts against it (~4 chars per token)."""
+    limiter = get_rate_limiter(
+        completion_kwargs["model"], rpm=LLM_RATE_LIMIT_RPM, tpm=LLM_RATE_LIMIT_TPM
     )
+    n_chars = sum(len(m["content"]) for m in completion_kwargs["messages"])
+    return limiter, n_chars // 4 + completion_kwargs["max_tokens"]
+
+
+def _add_usage(call: LLMCall, response: Any) -> None:
+    call.add_usage(response)
+    if (
+        LLM_BACKEND == "litellm"
+        and call.cost_usd == 0
+        and call.prompt_tokens + call.completion_tokens > 0
+    ):
+        try:
+            prompt_cost, completion_cost = get_litellm().cost_per_token(
+                model=call.model,
+                prompt_tokens=call.prompt_tokens,
+                completion_tokens=call.completion_tokens,
+            )
+            call.cost_usd = prompt_cost + completion_cost
+        except Exception as e:  # unknown model pricing
+            logger.debug(f"no llm cost model={call.model}: {e!r}")
+
+
+def get_llm_json_response(
+    gpt_role: str,
+    gpt_query: str,
+    gpt_model: str,
+    gpt_max_tokens: int,
+    use_cache: bool = True,
+    call_site: str = "unknown",
+    expected_fields: dict | None = None,
+) -> dict:
+    kwargs = _completion_kwargs(gpt_role, gpt_query, gpt_model, gpt_max_tokens)
+    cache = _get_cache(use_cache)
+    with track_llm_call(call_site, gpt_model) as call:
+        if cache is not None:
+            key = _cache_key(kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                logger.debug(f"llm cache hit model={gpt_model}")
+                call.cache_hit = True
+                return cached
+        limiter, n_tokens = _rate_limit(kwargs)
+        backend_kwargs = _backend_kwargs(kwargs, expected_fields)
+        response = call_with_rate_limit(
+            limiter,
+            n_tokens,
+            lambda: get_llm_backend().completion(**backend_kwargs),
+            call.count_retry,
+        )
+        _add_usage(call, response)
     response_json = json.loads(response.choices[0].message.content)  # type: ignore
+    if cache is not None:
+        cache.put(key, gpt_model, response_json)
     return response_json
+
+
+async def aget_llm_json_response(
+    gpt_role: str,
+    gpt_query: str,
+    gpt_model: str,
+    gpt_max_tokens: int,
+    use_cache: bool = True,
+    call_site: str = "unknown",
+    expected_fields: dict | None = None,
+) -> dict:
+    """Async version of `get_llm_json_response` (litellm.acompletion)."""
+    kwargs = _completion_kwargs(gpt_role, gpt_query, gpt_model, gpt_max_tokens)
+    cache = _get_cache(use_cache)
+    with track_llm_call(call_site, gpt_model) as call:
+        if cache is not None:
+            key = _cache_key(kwargs)
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                logger.debug(f"llm cache hit model={gpt_model}")
+                call.cache_hit = True
+                return cached
+        limiter, n_tokens = _rate_limit(kwargs)
+        backend_kwargs = _backend_kwargs(kwargs, expected_fields)
+        response = await acall_with_rate_limit(
+            limiter,
+            n_tokens,
+            lambda: get_llm_backend().acompletion(**backend_kwargs),
+            call.count_retry,
+        )
+        _add_usage(call, response)
+    response_json = json.loads(response.choices[0].message.content)  # type: ignore
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, gpt_model, response_json)
+    return response_json
+
+
+async def astream_llm_json_fields(
+    gpt_role: str,
+    gpt_query: str,
+    gpt_model: str,
+    gpt_max_tokens: int,
+    use_cache: bool = True,
+    call_site: str = "unknown",
+    expected_fields: dict | None = None,
+) -> AsyncIterator[tuple[str, Any]]:
+    """Stream the JSON response and yield its top-level (field, value) pairs one by one,
+    each as soon as it is complete (in the order the model writes them)."""
+    kwargs = _completion_kwargs(gpt_role, gpt_query, gpt_model, gpt_max_tokens)
+    kwargs["stream"] = True
+    kwargs["stream_options"] = {"include_usage": True}
+    cache = _get_cache(use_cache)
+    with track_llm_call(call_site, gpt_model) as call:
+        if cache is not None:
+            key = _cache_key(kwargs)
+            cached = await asyncio.to_thread(cache.get, key)
+            if cached is not None:
+                logger.debug(f"llm cache hit model={gpt_model}")
+                call.cache_hit = True
+                for field in cached.items():
+                    yield field
+                return
+        limiter, n_tokens = _rate_limit(kwargs)
+        backend_kwargs = _backend_kwargs(kwargs, expected_fields)
+        stream = await acall_with_rate_limit(
+            limiter,
+            n_tokens,
+            lambda: get_llm_backend().acompletion(**backend_kwargs),
+            call.count_retry,
+        )
+        parser = JSONObjectStreamParser()
+        try:
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    _add_usage(call, chunk)
+                if len(chunk.choices) == 0:  # the final usage chunk has no choices
+                    continue
+                content = chunk.choices[0].delta.content  # type: ignore
+                if content:
+                    for field in parser.feed(content):
+                        yield field
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:  # stop the generation if the caller stopped early
+                await aclose()
+        response_json = parser.close()
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, gpt_model, response_json)
@@ -0,0 +1,101 @@
+"""
+Shared MongoDB access for the db and web ETLs (one pooled client per process).
+"""
+
+import atexit
+import threading
+
+import pymongo
+from dotenv import find_dotenv, load_dotenv
+from envparse import env
+from loguru import logger
+from pymongo.collection import Collection
+
+load_dotenv(find_dotenv())
+
+MONGO_USER = env.str("MONGO_INITDB_ROOT_USERNAME")
+MONGO_PASSWORD = env.str("MONGO_INITDB_ROOT_PASSWORD")
+MONGO_HOST = env.str("MONGO_HOST")
+MONGO_PORT = env.int("MONGO_PORT")
+MONGODB_URI = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}?retryWrites=true&w=majority"
+MONGO_NEWS_DB = "news"
+MONGO_NEWS_COLLECTION = "gnews"
+MONGO_WATERMARKS_COLLECTION = "gnews_watermarks"
+MONGO_HTML_COLLECTION = "gnews_html"
+MONGO_MAX_POOL_SIZE = env.int("MONGO_MAX_POOL_SIZE", default=20)
+MONGO_MIN_POOL_SIZE = env.int("MONGO_MIN_POOL_SIZE", default=1)
+MONGO_MAX_IDLE_TIME_MS = env.int("MONGO_MAX_IDLE_TIME_MS", default=300_000)
+MONGO_CONNECT_TIMEOUT_MS = env.int("MONGO_CONNECT_TIMEOUT_MS", default=5_000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = env.int("MONGO_SERVER_SELECTION_TIMEOUT_MS", default=10_000)
+MONGO_SOCKET_TIMEOUT_MS = env.int("MONGO_SOCKET_TIMEOUT_MS", default=60_000)
+MONGO_COMPRESSORS = env.str("MONGO_COMPRESSORS", default="zstd,zlib")
+
+_client: pymongo.MongoClient | None = None
+_client_lock = threading.Lock()
+_indexes_ready = False
+
+
+def get_mongo_client() -> pymongo.MongoClient:
+    """Get or create the process-wide Mongo client."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = pymongo.MongoClient(
+                    MONGODB_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    minPoolSize=MONGO_MIN_POOL_SIZE,
+                    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                    socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+                    compressors=MONGO_COMPRESSORS,
+                )
+                logger.info(
+                    f"created mongo client host={MONGO_HOST}:{MONGO_PORT} "
+                    f"max_pool_size={MONGO_MAX_POOL_SIZE} compressors={MONGO_COMPRESSORS}"
+                )
+    return _client
+
+
+def get_news_collection() -> Collection:
+    return get_mongo_client()[MONGO_NEWS_DB][MONGO_NEWS_COLLECTION]
+
+
+def get_watermarks_collection() -> Collection:
+    return get_mongo_client()[MONGO_NEWS_DB][MONGO_WATERMARKS_COLLECTION]
+
+
+def get_html_collection() -> Collection:
+    return get_mongo_client()[MONGO_NEWS_DB][MONGO_HTML_COLLECTION]
+
+
+def ensure_news_indexes() -> None:
+    """Create the news collection indexes (once per process)."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    collection = get_news_collection()
+    collection.create_index([("url", pymongo.ASCENDING)], unique=True)
+    collection.create_index([("published_at", pymongo.DESCENDING)])
+    collection.create_index(
+        [("etl_status", pymongo.ASCENDING), ("listing_query", pymongo.ASCENDING)]
+    )
+    get_html_collection().create_index([("url", pymongo.ASCENDING)], unique=True)
+    get_watermarks_collection().create_index(
+        [("query", pymongo.ASCENDING), ("source", pymongo.ASCENDING)], unique=True
+    )
+    _indexes_ready = True
+    logger.info("ensured mongo news indexes")
+
+
+def close_mongo_client() -> None:
+    global _client, _indexes_ready
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+            _indexes_ready = False
+
+
+atexit.register(close_mongo_client)
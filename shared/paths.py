@@ -35,6 +35,13 @@ WEB_APP_LOG_PATH = LOG_FILE_DIR / "web_app_log.log"
 WEB_ETL_LOG_PATH = LOG_FILE_DIR / "web_etl_log.log"
 DB_ETL_LOG_PATH = LOG_FILE_DIR / "db_etl_log.log"
 
+# Cache paths (./data/cache is mounted here by every service: the rate limit buckets are
+# shared across processes and containers)
+CACHE_DIR = PROJECT_ROOT / DATA_DIR / "cache"
+LLM_CACHE_PATH = CACHE_DIR / "llm_cache.sqlite3"
+RATE_LIMITS_PATH = CACHE_DIR / "rate_limits.sqlite3"
+PAGE_CACHE_PATH = CACHE_DIR / "page_cache.sqlite3"
+
 # Database paths
 DB_DATA_DIR = DB_ROOT / DATA_DIR
 DB_LOGS_DIR = DB_ROOT / "logs"
@@ -48,6 +55,7 @@ def ensure_directories():
         HTML_STATIC_DIR,
         STATIC_IMAGE_DIR,
         LOG_FILE_DIR,
+        CACHE_DIR,
         DB_DATA_DIR,
         DB_LOGS_DIR,
         DB_SECRETS_DIR,
@@ -0,0 +1,224 @@
+"""
+Token-bucket rate limits shared by all local processes (through SQLite) and retries with
+exponential backoff for the LLM and image API calls.
+"""
+
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import TypeVar
+
+from envparse import env
+from loguru import logger
+
+from shared.paths import RATE_LIMITS_PATH
+
+T = TypeVar("T")
+
+LLM_RATE_LIMIT_RPM = env.int("LLM_RATE_LIMIT_RPM", default=500)
+LLM_RATE_LIMIT_TPM = env.int("LLM_RATE_LIMIT_TPM", default=200_000)
+IMAGE_RATE_LIMIT_RPM = env.int("IMAGE_RATE_LIMIT_RPM", default=5)
+RATE_LIMIT_BURST_SECONDS = env.float("RATE_LIMIT_BURST_SECONDS", default=10.0)
+LLM_RETRY_MAX_ATTEMPTS = env.int("LLM_RETRY_MAX_ATTEMPTS", default=5)
+LLM_RETRY_BASE_DELAY_SECONDS = env.float("LLM_RETRY_BASE_DELAY_SECONDS", default=1.0)
+LLM_RETRY_MAX_DELAY_SECONDS = env.float("LLM_RETRY_MAX_DELAY_SECONDS", default=60.0)
+
+_limiters: dict[str, "TokenBucketLimiter"] = {}
+_limiters_lock = threading.Lock()
+
+
+class TokenBucketLimiter:
+    """Requests-per-minute and tokens-per-minute buckets kept in a SQLite file.
+
+    Every process using the same file draws from the same buckets; the buckets hold at most
+    `burst_seconds` worth of quota, so an idle period is not followed by a large burst."""
+
+    def __init__(
+        self,
+        name: str,
+        rpm: int,
+        tpm: int | None = None,
+        path: Path = RATE_LIMITS_PATH,
+        burst_seconds: float = RATE_LIMIT_BURST_SECONDS,
+    ):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.path = path
+        self.max_requests = max(1.0, rpm * burst_seconds / 60)
+        self.max_tokens = max(1.0, tpm * burst_seconds / 60) if tpm is not None else 0.0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS buckets (
+                    name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _update(self, take: Callable[[float, float], tuple[float, float, float]]) -> float:
+        """Refill the buckets and apply `take` in one exclusive transaction."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at FROM buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+            if row is None:
+                requests, tokens = self.max_requests, self.max_tokens
+            else:
+                elapsed = max(0.0, now - row[2])
+                requests = min(self.max_requests, row[0] + elapsed * self.rpm / 60)
+                tokens = min(self.max_tokens, row[1] + elapsed * (self.tpm or 0) / 60)
+            requests, tokens, wait = take(requests, tokens)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (name, requests, tokens, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.name, requests, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:  # BEGIN IMMEDIATE itself may have failed (locked)
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return wait
+
+    def _try_acquire(self, n_tokens: int) -> float:
+        """Take one request and `n_tokens` tokens; returns 0 or the seconds to wait first."""
+        n_tokens = min(float(n_tokens), self.max_tokens) if self.tpm is not None else 0.0
+
+        def take(requests: float, tokens: float) -> tuple[float, float, float]:
+            if requests >= 1 and tokens >= n_tokens:
+                return requests - 1, tokens - n_tokens, 0.0
+            wait = (1 - requests) * 60 / self.rpm
+            if self.tpm is not None:
+                wait = max(wait, (n_tokens - tokens) * 60 / self.tpm)
+            return requests, tokens, max(wait, 0.01)
+
+        return self._update(take)
+
+    def acquire(self, n_tokens: int = 0) -> None:
+        while (wait := self._try_acquire(n_tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, n_tokens: int = 0) -> None:
+        while (wait := await asyncio.to_thread(self._try_acquire, n_tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def drain(self) -> None:
+        """Empty the request bucket after the API throttled us (all processes slow down)."""
+        self._update(lambda requests, tokens: (min(requests, 0.0), tokens, 0.0))
+
+
+def get_rate_limiter(name: str, rpm: int, tpm: int | None = None) -> TokenBucketLimiter:
+    """Get the process-wide limiter of the model/endpoint `name`."""
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = TokenBucketLimiter(name=name, rpm=rpm, tpm=tpm)
+            logger.debug(f"created rate limiter {name=} {rpm=} {tpm=}")
+        return _limiters[name]
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+    headers = getattr(error, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        if (value := headers.get("retry-after-ms")) is not None:
+            return float(value) / 1000
+        if (value := headers.get("retry-after")) is not None:
+            try:
+                return float(value)
+            except ValueError:
+                return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _retry_delay(attempt: int, error: Exception) -> float | None:
+    """Seconds to wait before retrying after the error (None if it is not retryable)."""
+    status_code = getattr(error, "status_code", None)
+    if not isinstance(status_code, int) or not (
+        status_code in (408, 409, 429) or status_code >= 500
+    ):
+        return None
+    retry_after = _retry_after_seconds(error)
+    if retry_after is not None:
+        return min(max(retry_after, 0.0), LLM_RETRY_MAX_DELAY_SECONDS) + random.uniform(0, 0.5)
+    # exponential backoff with full jitter
+    return random.uniform(
+        0, min(LLM_RETRY_MAX_DELAY_SECONDS, LLM_RETRY_BASE_DELAY_SECONDS * 2**attempt)
+    )
+
+
+def _should_retry(limiter: TokenBucketLimiter, attempt: int, error: Exception) -> float | None:
+    delay = _retry_delay(attempt, error)
+    if delay is None or attempt + 1 >= LLM_RETRY_MAX_ATTEMPTS:
+        return None
+    if getattr(error, "status_code", None) == 429:
+        limiter.drain()
+    logger.warning(
+        f"retrying {limiter.name} call attempt={attempt + 1} delay={delay:.2f}s: {error!r}"
+    )
+    return delay
+
+
+def call_with_rate_limit(
+    limiter: TokenBucketLimiter,
+    n_tokens: int,
+    call: Callable[[], T],
+    on_retry: Callable[[], None] | None = None,
+) -> T:
+    """Run the API call within the rate limits, retrying 429/5xx errors with backoff."""
+    attempt = 0
+    while True:
+        limiter.acquire(n_tokens)
+        try:
+            return call()
+        except Exception as e:
+            delay = _should_retry(limiter, attempt, e)
+            if delay is None:
+                raise
+        if on_retry is not None:
+            on_retry()
+        time.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_rate_limit(
+    limiter: TokenBucketLimiter,
+    n_tokens: int,
+    call: Callable[[], Awaitable[T]],
+    on_retry: Callable[[], None] | None = None,
+) -> T:
+    """Async version of `call_with_rate_limit`."""
+    attempt = 0
+    while True:
+        await limiter.aacquire(n_tokens)
+        try:
+            return await call()
+        except Exception as e:
+            delay = await asyncio.to_thread(_should_retry, limiter, attempt, e)
+            if delay is None:
+                raise
+        if on_retry is not None:
+            on_retry()
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,19 @@
+import os
+
+# dummy settings so the modules can be imported without a .env (no test talks to a server)
+for name, value in {
+    "GNEWS_API_KEY": "test",
+    "NEWS_QUERY_EVERY_X_SECONDS": "3600",
+    "NEWS_QUERY_WINDOW_EXTENSION_SECONDS": "600",
+    "MONGO_INITDB_ROOT_USERNAME": "test",
+    "MONGO_INITDB_ROOT_PASSWORD": "test",
+    "MONGO_HOST": "localhost",
+    "MONGO_PORT": "27017",
+    "OPENAI_API_KEY": "test",
+    "TEXT_MODEL_SUMMARIZER": "gpt-4o-mini",
+    "TEXT_MODEL_SUMMARIZER_MAX_TOKENS": "500",
+    "TEXT_MODEL_WRITER": "gpt-4o",
+    "TEXT_MODEL_WRITER_MAX_TOKENS": "1000",
+    "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+import web.llm_cthulhu_logic as logic
+
+VERDICTS = {
+    "pertinence": "high",
+    "premonition": "no",
+    "stylistic_quality": "medium",
+    "novelty": "high",
+    "contradicting": "no",
+    "sentiment": "neutral",
+    "aggressive": "no",
+    "sexual": "no",
+    "spam": "no",
+    "illegal": "no",
+    "unsafe": "no",
+}
+REWRITE = {
+    "scene_update": "There is a rumor that the tide rose at night.",
+    "censored_comment": "The tide rose at night, [name] saw it.",
+}
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """Fake LLM stream of the censorship fields; records the fields sent and the close."""
+    sent: list[str] = []
+    closed = [False]
+
+    def stream_response(response: dict):
+        async def astream_llm_json_fields(**kwargs):
+            try:
+                for field, value in response.items():
+                    sent.append(field)
+                    yield field, value
+            finally:
+                closed[0] = True
+
+        monkeypatch.setattr(logic, "astream_llm_json_fields", astream_llm_json_fields)
+        monkeypatch.setattr(logic.prompts, "create_censorship_prompt", lambda comment, scene: "")
+        return sent, closed
+
+    return stream_response
+
+
+def _censor() -> dict:
+    return asyncio.run(logic.acensor_comment(comment="comment", scene={"scene_updates": []}))
+
+
+def test_clean_comment_is_rewritten(stream):
+    sent, closed = stream({**VERDICTS, **REWRITE})
+
+    censored_comment = _censor()
+
+    assert censored_comment["censored_comment"] == REWRITE["censored_comment"]
+    assert censored_comment["preselected"]
+    assert closed[0]
+
+
+def test_spam_verdict_stops_the_stream_before_the_rewrite(stream):
+    sent, closed = stream({**VERDICTS, "spam": "yes", **REWRITE})
+
+    censored_comment = _censor()
+
+    assert censored_comment["censored_comment"] == logic.CENSORSHIP_REJECTED_COMMENT
+    assert censored_comment["spam"] == "yes"
+    assert not censored_comment["preselected"]
+    assert sent[-1] == "spam"
+    assert closed[0]
@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import db.etl as etl
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def gnews(monkeypatch):
+    """Fake GNews search over `articles`: `to` is inclusive, newest first, `limit` per page."""
+    articles: list[dict] = []
+    requests: list[tuple] = []
+
+    def get_news_links_gnews(query, from_, to_, lang, limit, sortby):
+        assert sortby == "publishedAt"
+        requests.append((from_, to_))
+        hits = [
+            a
+            for a in articles
+            if (from_ is None or a["published_at"] >= from_)
+            and (to_ is None or a["published_at"] <= to_)
+        ]
+        hits.sort(key=lambda a: a["published_at"], reverse=True)
+        return [dict(a) for a in hits[:limit]]
+
+    monkeypatch.setattr(etl, "get_news_links_gnews", get_news_links_gnews)
+    return articles, requests
+
+
+def _article(i: int, published_at: datetime) -> dict:
+    return {"url": f"https://news.example/{i}", "published_at": published_at}
+
+
+def test_paging_lists_the_whole_window_after_an_outage(gnews):
+    articles, requests = gnews
+    articles.extend(_article(i, T0 + timedelta(minutes=i)) for i in range(35))
+
+    listings, complete = etl.get_news_listings_paged("finance", from_=T0, to_=None)
+
+    assert complete
+    assert sorted(x["url"] for x in listings) == sorted(a["url"] for a in articles)
+    assert len(requests) == 4
+
+
+def test_paging_reports_an_incomplete_window(gnews, monkeypatch):
+    articles, _ = gnews
+    articles.extend(_article(i, T0 + timedelta(minutes=i)) for i in range(35))
+    monkeypatch.setattr(etl, "GNEWS_MAX_PAGES", 2)
+
+    listings, complete = etl.get_news_listings_paged("finance", from_=T0, to_=None)
+
+    assert not complete
+    assert len(listings) < len(articles)
+
+
+def test_paging_moves_past_a_full_page_within_one_second(gnews):
+    articles, _ = gnews
+    articles.extend(_article(i, T0 + timedelta(hours=1)) for i in range(etl.GNEWS_MAX_ARTICLES))
+    articles.append(_article(100, T0))
+
+    listings, complete = etl.get_news_listings_paged("finance", from_=T0, to_=None)
+
+    assert complete
+    assert len(listings) == etl.GNEWS_MAX_ARTICLES + 1
+
+
+@pytest.mark.parametrize("max_pages, advanced", [(10, True), (2, False)])
+def test_load_news_advances_the_watermark_only_for_a_complete_window(
+    gnews, monkeypatch, max_pages, advanced
+):
+    articles, _ = gnews
+    articles.extend(_article(i, T0 + timedelta(minutes=i)) for i in range(35))
+    watermarks = []
+    monkeypatch.setattr(etl, "GNEWS_MAX_PAGES", max_pages)
+    monkeypatch.setattr(etl, "drop_known_news_listings", lambda listings: [])
+    monkeypatch.setattr(etl, "get_pending_news_listings", lambda query, from_: [])
+    monkeypatch.setattr(
+        etl,
+        "advance_watermark",
+        lambda query, source, published_at: watermarks.append(published_at),
+    )
+
+    etl.load_news("finance", from_=T0, to_=None)
+
+    assert watermarks == ([T0 + timedelta(minutes=34)] if advanced else [])
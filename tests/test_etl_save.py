@@ -0,0 +1,80 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import db.etl as etl
+
+
+class FakeNewsCollection:
+    """The upsert and lookup queries of the ETL on a dict of docs by url."""
+
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+
+    def update_one(self, filter_, update, upsert):
+        doc = self.docs.get(filter_["url"])
+        if (doc is not None) and (doc.get("etl_status") != filter_["etl_status"]):
+            raise DuplicateKeyError("url")  # the upsert inserts a second doc with the url
+        doc = self.docs.setdefault(filter_["url"], {"url": filter_["url"]})
+        doc.update(update["$set"])
+        for key, n in update["$inc"].items():
+            doc[key] = doc.get(key, 0) + n
+
+    def find(self, filter_, projection):
+        urls = filter_["url"]["$in"]
+        return [
+            {"url": doc["url"]}
+            for url, doc in self.docs.items()
+            if (url in urls)
+            and (
+                (doc.get("etl_status") != etl.NEWS_STATUS_PENDING)
+                or (doc["etl_attempts"] >= etl.NEWS_ARTICLE_MAX_ATTEMPTS)
+            )
+        ]
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    collection = FakeNewsCollection()
+    monkeypatch.setattr(etl, "get_news_collection", lambda: collection)
+    monkeypatch.setattr(etl, "store_html_pages", lambda articles: None)
+    monkeypatch.setattr(etl, "index_saved_article", lambda article: None)
+    monkeypatch.setattr(etl, "_recent_urls", type(etl._recent_urls)())
+    return collection
+
+
+def _listing(url: str, **fields) -> dict:
+    return {"url": url, "title": url, **fields}
+
+
+def test_failed_article_is_pending_and_retried(collection):
+    etl.save_news_article(_listing("u1", full_text="text"))  # the summary timed out
+
+    assert collection.docs["u1"]["etl_status"] == etl.NEWS_STATUS_PENDING
+    assert etl.drop_known_news_listings([_listing("u1")]) == [_listing("u1")]
+
+    etl.save_news_article(_listing("u1", full_text="text", gpt_summary="summary"))
+
+    doc = collection.docs["u1"]
+    assert (doc["etl_status"], doc["gpt_summary"], doc["etl_attempts"]) == ("done", "summary", 2)
+    assert etl.drop_known_news_listings([_listing("u1")]) == []
+
+
+def test_pending_article_is_dropped_after_the_last_attempt(collection):
+    for _ in range(etl.NEWS_ARTICLE_MAX_ATTEMPTS):
+        etl.save_news_article(_listing("u1"))  # the download failed
+
+    assert etl.drop_known_news_listings([_listing("u1")]) == []
+
+
+def test_done_article_is_never_overwritten(collection):
+    etl.save_news_article(_listing("u1", gpt_summary="summary"))
+    etl.save_news_article(_listing("u1"))  # a concurrent query failed on the same url
+
+    assert collection.docs["u1"]["gpt_summary"] == "summary"
+    assert collection.docs["u1"]["etl_status"] == etl.NEWS_STATUS_DONE
+
+
+def test_duplicate_article_is_done(collection):
+    etl.save_news_article(_listing("u2", duplicate_of="u1"))
+
+    assert collection.docs["u2"]["etl_status"] == etl.NEWS_STATUS_DONE
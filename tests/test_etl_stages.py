@@ -0,0 +1,66 @@
+import asyncio
+
+from db.etl import _STAGE_DONE, _run_stage
+
+
+async def _run_batches(
+    n_items: int, arrival_seconds: float, batch_size: int, linger_seconds: float
+) -> tuple[list[int], list]:
+    in_queue: asyncio.Queue = asyncio.Queue(maxsize=batch_size)
+    out_queue: asyncio.Queue = asyncio.Queue()
+    batch_sizes: list[int] = []
+
+    async def produce() -> None:
+        for i in range(n_items):
+            await asyncio.sleep(arrival_seconds)
+            await in_queue.put({"i": i})
+        await in_queue.put(_STAGE_DONE)
+
+    async def summarize(items: list[dict]) -> list[dict]:
+        batch_sizes.append(len(items))
+        await asyncio.sleep(0.05)
+        return items
+
+    await asyncio.gather(
+        produce(),
+        _run_stage(
+            summarize,
+            in_queue,
+            out_queue,
+            n_workers=4,
+            batch_size=batch_size,
+            batch_linger_seconds=linger_seconds,
+        ),
+    )
+    results = []
+    while not out_queue.empty():
+        results.append(out_queue.get_nowait())
+    return batch_sizes, results
+
+
+def test_articles_arriving_one_by_one_share_batches():
+    batch_sizes, results = asyncio.run(
+        _run_batches(n_items=10, arrival_seconds=0.01, batch_size=5, linger_seconds=0.5)
+    )
+
+    assert batch_sizes == [5, 5]
+    assert [x["i"] for x in results[:-1]] == list(range(10))
+    assert results[-1] is _STAGE_DONE
+
+
+def test_linger_ends_a_partial_batch():
+    batch_sizes, results = asyncio.run(
+        _run_batches(n_items=3, arrival_seconds=0.01, batch_size=5, linger_seconds=0.05)
+    )
+
+    assert sum(batch_sizes) == 3
+    assert len(results) == 4
+
+
+def test_without_batching_every_item_is_handled_once():
+    batch_sizes, results = asyncio.run(
+        _run_batches(n_items=7, arrival_seconds=0.0, batch_size=1, linger_seconds=0.0)
+    )
+
+    assert batch_sizes == [1] * 7
+    assert sorted(x["i"] for x in results[:-1]) == list(range(7))
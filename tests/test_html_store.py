@@ -0,0 +1,51 @@
+import zstandard
+
+import db.html_store as hs
+
+
+class FakeHtmlCollection:
+    def __init__(self):
+        self.docs: dict[str, dict] = {}
+
+    def bulk_write(self, ops, ordered):
+        for op in ops:
+            url = op._filter["url"]
+            doc = self.docs.setdefault(url, {"_id": f"html-{url}", "url": url})
+            doc.update(op._doc["$set"])
+
+    def find(self, filter_, projection):
+        return [doc for url, doc in self.docs.items() if url in filter_["url"]["$in"]]
+
+
+class FakeNewsCollection:
+    def __init__(self, docs: list[dict]):
+        self.docs = {doc["_id"]: doc for doc in docs}
+
+    def find(self, filter_, projection, limit):
+        docs = [dict(doc) for doc in self.docs.values() if "full_html" in doc]
+        return docs[:limit]
+
+    def update_one(self, filter_, update):
+        doc = self.docs[filter_["_id"]]
+        doc.update(update["$set"])
+        for key in update["$unset"]:
+            doc.pop(key)
+
+
+def test_migrate_inline_html_moves_every_page_to_the_store(monkeypatch):
+    html_collection = FakeHtmlCollection()
+    news_collection = FakeNewsCollection(
+        [{"_id": i, "url": f"u{i}", "full_html": f"<p>{i}</p>"} for i in range(5)]
+        + [{"_id": 5, "url": "u5"}]
+    )
+    monkeypatch.setattr(hs, "get_html_collection", lambda: html_collection)
+    monkeypatch.setattr(hs, "get_news_collection", lambda: news_collection)
+
+    assert hs.migrate_inline_html(batch_size=2) == 5
+    assert hs.migrate_inline_html(batch_size=2) == 0
+
+    doc = news_collection.docs[3]
+    assert doc == {"_id": 3, "url": "u3", "full_html_id": "html-u3"}
+    blob = html_collection.docs["u3"]["html_zstd"]
+    assert zstandard.ZstdDecompressor().decompress(blob).decode("utf-8") == "<p>3</p>"
+    assert "full_html_id" not in news_collection.docs[5]
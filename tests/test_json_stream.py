@@ -0,0 +1,54 @@
+import json
+import random
+
+import pytest
+
+from shared.json_stream import JSONObjectStreamParser
+
+RESPONSE = {
+    "pertinence": "high",
+    "spam": "no",
+    "votes": [1, 2, {"nested": "a, b}"}],
+    "quote": 'he said "no, {never}" \\ twice',
+    "empty": {},
+    "censored_comment": "There is a rumor that the sea rose.",
+}
+
+
+def _chunks(text: str, rng: random.Random) -> list[str]:
+    chunks, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 12)
+        chunks.append(text[i : i + n])
+        i += n
+    return chunks
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_fields_complete_in_order_for_any_chunking(seed):
+    text = json.dumps(RESPONSE, indent=seed % 3 or None)
+    parser = JSONObjectStreamParser()
+
+    fields = []
+    for chunk in _chunks(text, random.Random(seed)):
+        fields.extend(parser.feed(chunk))
+
+    assert fields == list(RESPONSE.items())
+    assert parser.done
+    assert parser.close() == RESPONSE
+
+
+def test_a_field_is_returned_once_its_value_is_complete():
+    parser = JSONObjectStreamParser()
+
+    assert parser.feed('{"spam": "ye') == []
+    assert parser.feed('s", "comment": "a') == [("spam", "yes")]
+    assert parser.fields == {"spam": "yes"}
+
+
+def test_close_fails_on_an_unterminated_object():
+    parser = JSONObjectStreamParser()
+    parser.feed('{"spam": "no", "comment": "cut')
+
+    with pytest.raises(json.JSONDecodeError):
+        parser.close()
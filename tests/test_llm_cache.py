@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+import shared.llm_cache as lc
+
+MESSAGES = [
+    {"role": "system", "content": "You're a news editor"},
+    {"role": "user", "content": "x"},
+]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(lc.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return lc.LLMResponseCache(tmp_path / "llm_cache.sqlite3", ttl_seconds=60, max_bytes=100)
+
+
+def test_key_depends_on_everything_that_determines_the_completion():
+    key = lc.llm_cache_key("gpt-4o-mini", MESSAGES, temperature=0.0, max_tokens=500)
+
+    assert key == lc.llm_cache_key("gpt-4o-mini", MESSAGES, temperature=0.0, max_tokens=500)
+    assert key == lc.llm_cache_key(
+        "gpt-4o-mini", [dict(reversed(m.items())) for m in MESSAGES], 0.0, 500
+    )
+    assert key != lc.llm_cache_key("gpt-4o", MESSAGES, temperature=0.0, max_tokens=500)
+    assert key != lc.llm_cache_key("gpt-4o-mini", MESSAGES, temperature=0.5, max_tokens=500)
+    assert key != lc.llm_cache_key("gpt-4o-mini", MESSAGES[1:], temperature=0.0, max_tokens=500)
+
+
+def test_response_expires_after_the_ttl(cache, clock):
+    cache.put("k1", "model", {"summary": "a"})
+    clock[0] += 59
+
+    assert cache.get("k1") == {"summary": "a"}
+
+    clock[0] += 2
+
+    assert cache.get("k1") is None
+    assert cache.stats() == {"hits": 1, "misses": 1}
+
+
+def test_least_recently_used_responses_are_evicted(cache, clock):
+    for key in ["k1", "k2", "k3"]:
+        cache.put(key, "model", {"text": "x" * 20})  # 32 bytes each
+        clock[0] += 1
+    cache.get("k1")
+    clock[0] += 1
+
+    cache.put("k4", "model", {"text": "x" * 20})
+
+    cached = [k for k in ["k1", "k2", "k3", "k4"] if cache.get(k) is not None]
+    assert cached == ["k1", "k3", "k4"]
+
+
+def test_connections_are_closed(cache, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def tracked_connect(*args, **kwargs) -> sqlite3.Connection:
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(lc.sqlite3, "connect", tracked_connect)
+    cache.put("k1", "model", {"summary": "a"})
+    cache.get("k1")
+    cache.get("k2")
+
+    assert len(connections) == 3
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
@@ -0,0 +1,56 @@
+import asyncio
+
+import db.llm_summary as ls
+
+RESPONSE = {
+    "summary": "A summary.",
+    "keywords": "harbour, storm",
+    "sectors": "transport",
+    "mood": "negative",
+    "breaking_news": "no",
+    "like_a_hollywood_movie": "no",
+    "trustworthy": "yes",
+    "economic_impact": "low",
+}
+
+
+def test_tokenizer_error_fails_only_that_article(monkeypatch):
+    def count_tokens(text: str, model: str) -> int:
+        if "broken" in text:
+            raise RuntimeError("failed to load tiktoken encoding")
+        return len(text.split())
+
+    async def aget_llm_json_response(**kwargs) -> dict:
+        return RESPONSE
+
+    monkeypatch.setattr(ls, "count_tokens", count_tokens)
+    monkeypatch.setattr(ls, "_shape_listing_text", lambda listing: listing["full_text"])
+    monkeypatch.setattr(ls, "aget_llm_json_response", aget_llm_json_response)
+    listings = [
+        {"title": "t1", "full_text": "a broken article"},
+        {"title": "t2", "full_text": "a good article"},
+    ]
+
+    asyncio.run(ls.add_gpt_info_async(listings, batch_size=1))
+
+    assert "gpt_summary" not in listings[0]
+    assert listings[1]["gpt_summary"] == "A summary."
+
+
+def test_batch_prompt_tokens_are_split_across_the_articles(monkeypatch):
+    async def aget_llm_json_response(**kwargs) -> dict:
+        return {"articles": [{"id": i, **RESPONSE} for i in range(3)]}
+
+    monkeypatch.setattr(ls, "count_tokens", lambda text, model: len(text.split()))
+    monkeypatch.setattr(ls, "_shape_listing_text", lambda listing: listing["full_text"])
+    monkeypatch.setattr(ls, "aget_llm_json_response", aget_llm_json_response)
+    listings = [{"title": f"t{i}", "full_text": "word " * n} for i, n in enumerate([10, 20, 30])]
+
+    asyncio.run(ls.add_gpt_info_async(listings, batch_size=3))
+
+    n_input_tokens = [x["gpt_input_tokens"] for x in listings]
+    assert all(x["gpt_batch_size"] == 3 for x in listings)
+    assert n_input_tokens[0] < n_input_tokens[1] < n_input_tokens[2]
+    texts = "\n\n".join(f"### ARTICLE id={i}\n{x['full_text']}" for i, x in enumerate(listings))
+    query = ls.GPT_BATCH_QUERY.format(texts=texts)
+    assert sum(n_input_tokens) == len((ls.GPT_ROLE + query).split())
@@ -0,0 +1,128 @@
+import pytest
+
+import db.near_duplicates as nd
+
+ARTICLE_TEXT = (
+    "The harbour authority closed the northern docks on Tuesday after fishermen reported "
+    "strange lights beneath the water. Officials said the closure would last until divers "
+    "finished inspecting the sea wall, which was damaged during last week's storm. Local "
+    "businesses warned that a long closure would hurt the spring season, while the mayor "
+    "promised compensation for boat owners who lose income during the inspection."
+)
+
+
+@pytest.fixture(autouse=True)
+def lsh_index(monkeypatch):
+    index = nd.MinHashLSHIndex()
+    monkeypatch.setattr(nd, "_lsh_index", index)
+    return index
+
+
+def _listing(url: str, text: str = ARTICLE_TEXT) -> dict:
+    return {"url": url, "title": url, "full_text": text}
+
+
+def _save(listing: dict, summarized: bool = True) -> None:
+    """What `save_news_article` does to the index once the article is stored."""
+    if summarized and "duplicate_of" not in listing:
+        listing["gpt_summary"] = "summary"
+    nd.index_saved_article(listing)
+
+
+def test_same_url_twice_is_not_a_duplicate_of_itself():
+    first, second = _listing("u1"), _listing("u1")
+    nd.link_near_duplicates([first])
+    _save(first)
+
+    nd.link_near_duplicates([second])
+
+    assert "duplicate_of" not in second
+
+
+def test_retry_of_unsaved_listings_does_not_link_them():
+    listings = [_listing("u1"), _listing("u2", ARTICLE_TEXT.replace("Tuesday", "Monday"))]
+    nd.link_near_duplicates(listings)  # the run fails before the articles are saved
+
+    retried = [_listing("u1"), _listing("u2", ARTICLE_TEXT.replace("Tuesday", "Monday"))]
+    nd.link_near_duplicates(retried)
+
+    assert all("duplicate_of" not in x for x in listings + retried)
+
+
+def test_syndicated_copy_links_to_the_saved_canonical():
+    canonical = _listing("u1")
+    nd.link_near_duplicates([canonical])
+    _save(canonical)
+
+    copy = _listing("u2", ARTICLE_TEXT + " Reporting by a wire service.")
+    nd.link_near_duplicates([copy])
+
+    assert copy["duplicate_of"] == "u1"
+    assert copy["duplicate_similarity"] >= nd.NEWS_NEAR_DUPLICATE_THRESHOLD
+
+
+def test_copies_within_one_run_link_to_the_first_listing():
+    run_index = nd.MinHashLSHIndex()
+    canonical, copy = _listing("u1"), _listing("u2", ARTICLE_TEXT + " Reporting by a wire.")
+    later_copy = _listing("u3", ARTICLE_TEXT.replace("Tuesday", "Monday"))
+
+    nd.link_near_duplicates([canonical, copy], run_index=run_index)
+    nd.link_near_duplicates([later_copy], run_index=run_index)  # next parse batch
+
+    assert "duplicate_of" not in canonical
+    assert copy["duplicate_of"] == "u1"
+    assert later_copy["duplicate_of"] == "u1"
+    assert len(run_index) == 1
+
+
+def test_listing_repeated_within_one_run_is_not_its_own_duplicate():
+    run_index = nd.MinHashLSHIndex()
+    first, second = _listing("u1"), _listing("u1")
+
+    nd.link_near_duplicates([first, second], run_index=run_index)
+
+    assert all("duplicate_of" not in x for x in [first, second])
+
+
+def test_copy_is_not_linked_to_a_canonical_without_summary(lsh_index):
+    canonical = _listing("u1")
+    nd.link_near_duplicates([canonical])
+    _save(canonical, summarized=False)
+
+    copy = _listing("u2")
+    nd.link_near_duplicates([copy])
+
+    assert len(lsh_index) == 0
+    assert "duplicate_of" not in copy
+
+
+def test_duplicates_are_not_indexed(lsh_index):
+    canonical, copy = _listing("u1"), _listing("u2")
+    nd.link_near_duplicates([canonical])
+    _save(canonical)
+    nd.link_near_duplicates([copy])
+    _save(copy)
+
+    assert len(lsh_index) == 1
+
+
+def test_save_indexes_only_done_articles(monkeypatch, lsh_index):
+    import db.etl as etl
+
+    class FakeCollection:
+        def update_one(self, filter_, update, upsert):
+            pass
+
+    monkeypatch.setattr(etl, "get_news_collection", lambda: FakeCollection())
+    monkeypatch.setattr(etl, "store_html_pages", lambda articles: None)
+
+    failed = _listing("u1")  # summarization failed: saved as pending, not a canonical
+    nd.link_near_duplicates([failed])
+    etl.save_news_article(failed)
+    assert len(lsh_index) == 0
+
+    article = _listing("u2")
+    nd.link_near_duplicates([article])
+    article["gpt_summary"] = "summary"
+    etl.save_news_article(article)
+    assert len(lsh_index) == 1
@@ -0,0 +1,82 @@
+import sqlite3
+
+import pytest
+
+import db.page_cache as pc
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pc.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return pc.PageCache(tmp_path / "page_cache.sqlite3", max_bytes=100)
+
+
+def _html(i: int) -> str:
+    return "".join(f"<p>{i}-{j}</p>" for j in range(10))
+
+
+def test_cached_page_is_fresh_until_revalidated(cache, clock):
+    cache.put("u1", _html(1), etag='"v1"', last_modified=None)
+    clock[0] += 10
+
+    page = cache.get("u1")
+
+    assert page.html == _html(1)
+    assert page.revalidation_headers() == {"If-None-Match": '"v1"'}
+    assert page.is_fresh(fresh_seconds=11)
+    assert not page.is_fresh(fresh_seconds=10)
+
+    cache.touch("u1")
+
+    assert cache.get("u1").is_fresh(fresh_seconds=1)
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path, clock):
+    page_size = len(pc.zstandard.ZstdCompressor(level=10).compress(_html(1).encode()))
+    cache = pc.PageCache(tmp_path / "lru.sqlite3", max_bytes=3 * page_size)
+    for url in ["u1", "u2", "u3"]:
+        cache.put(url, _html(1), etag=None, last_modified=None)
+        clock[0] += 1
+    cache.get("u1")
+    clock[0] += 1
+
+    cache.put("u4", _html(1), etag=None, last_modified=None)
+
+    cached = [url for url in ["u1", "u2", "u3", "u4"] if cache.get(url) is not None]
+    assert cached == ["u1", "u3", "u4"]
+
+
+def test_iter_pages_reads_every_page_in_chunks(cache, monkeypatch):
+    monkeypatch.setattr(pc, "PAGE_CACHE_ITER_CHUNK_SIZE", 2)
+    cache.max_bytes = 1 << 20
+    for i in range(5):
+        cache.put(f"u{i}", _html(i), etag=None, last_modified=None)
+
+    assert list(cache.iter_pages()) == [(f"u{i}", _html(i)) for i in range(5)]
+
+
+def test_connections_are_closed(cache, monkeypatch):
+    connections = []
+    connect = sqlite3.connect
+
+    def tracked_connect(*args, **kwargs) -> sqlite3.Connection:
+        connections.append(connect(*args, **kwargs))
+        return connections[-1]
+
+    monkeypatch.setattr(pc.sqlite3, "connect", tracked_connect)
+    cache.put("u1", _html(1), etag=None, last_modified=None)
+    cache.get("u1")
+    cache.touch("u1")
+    pages = cache.iter_pages()
+    next(pages)  # no connection stays open while the caller iterates
+
+    assert len(connections) == 4
+    for conn in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
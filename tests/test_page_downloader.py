@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+from db.page_downloader import _HostLimiter, _ProcessSemaphore
+
+
+def _run_in_threads(n_threads: int, coro_factory) -> None:
+    threads = [
+        threading.Thread(target=lambda: asyncio.run(coro_factory())) for _ in range(n_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_process_semaphore_limits_across_event_loops():
+    semaphore = _ProcessSemaphore(3)
+    lock = threading.Lock()
+    in_flight = [0, 0]  # current, max
+
+    async def job() -> None:
+        async with semaphore:
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            await asyncio.sleep(0.01)
+            with lock:
+                in_flight[0] -= 1
+
+    async def many_jobs() -> None:
+        await asyncio.gather(*(job() for _ in range(10)))
+
+    _run_in_threads(5, many_jobs)
+    assert in_flight == [0, 3]
+
+
+def test_process_semaphore_cancelled_waiter_keeps_the_slot_count():
+    semaphore = _ProcessSemaphore(1)
+
+    async def main() -> None:
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        semaphore.release()
+        await asyncio.sleep(0)
+        await asyncio.wait_for(semaphore.acquire(), timeout=1)
+        semaphore.release()
+
+    asyncio.run(main())
+    assert semaphore._value == 1
+
+
+def test_host_limiter_is_shared_by_concurrent_queries():
+    limiter = _HostLimiter(max_per_host=2, delay_seconds=0.0)
+    lock = threading.Lock()
+    in_flight = {"a.com": [0, 0], "b.com": [0, 0]}
+
+    async def download(host: str) -> None:
+        async with limiter.slot(host):
+            with lock:
+                in_flight[host][0] += 1
+                in_flight[host][1] = max(in_flight[host][1], in_flight[host][0])
+            await asyncio.sleep(0.01)
+            with lock:
+                in_flight[host][0] -= 1
+
+    async def query() -> None:
+        await asyncio.gather(*(download(host) for host in ["a.com", "b.com"] * 4))
+
+    _run_in_threads(5, query)
+    assert in_flight == {"a.com": [0, 2], "b.com": [0, 2]}
@@ -0,0 +1,52 @@
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import db.page_parser as pp
+
+
+class FakeExecutor:
+    """Pool whose first `n_broken` pools were broken by a crashed worker."""
+
+    n_created = 0
+    n_broken = 1
+
+    def __init__(self, max_workers, mp_context):
+        FakeExecutor.n_created += 1
+        self.broken = FakeExecutor.n_created <= FakeExecutor.n_broken
+        self.is_shut_down = False
+
+    def submit(self, fn, *args):
+        future: Future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("a worker crashed"))
+        else:
+            future.set_result({"full_text": "text", "tags": []})
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.is_shut_down = True
+
+
+@pytest.fixture(autouse=True)
+def fake_executor(monkeypatch):
+    monkeypatch.setattr(pp, "ProcessPoolExecutor", FakeExecutor)
+    monkeypatch.setattr(pp, "_parse_executor", None)
+    monkeypatch.setattr(FakeExecutor, "n_created", 0)
+
+
+def test_broken_pool_is_restarted_and_the_page_parsed_again():
+    fields = asyncio.run(pp.parse_page_async("u1", "<html></html>", run_nlp=False))
+
+    assert fields == {"full_text": "text", "tags": [], "full_html": "<html></html>"}
+    assert FakeExecutor.n_created == 2
+    assert not pp.get_parse_executor().broken
+
+
+def test_page_fails_after_one_retry(monkeypatch):
+    monkeypatch.setattr(FakeExecutor, "n_broken", 2)
+
+    assert asyncio.run(pp.parse_page_async("u1", "<html></html>", run_nlp=False)) is None
+    assert asyncio.run(pp.parse_page_async("u2", "<html></html>", run_nlp=False)) is not None
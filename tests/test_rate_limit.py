@@ -0,0 +1,81 @@
+import pytest
+
+import shared.rate_limit as rl
+
+
+class APIError(Exception):
+    def __init__(self, status_code: int, headers: dict | None = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.litellm_response_headers = headers
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "rate_limits.sqlite3"
+
+
+def test_limiters_on_the_same_file_share_the_buckets(path):
+    # two processes with their own limiter objects
+    first = rl.TokenBucketLimiter("model", rpm=60, path=path, burst_seconds=2)
+    second = rl.TokenBucketLimiter("model", rpm=60, path=path, burst_seconds=2)
+
+    assert first._try_acquire(0) == 0
+    assert second._try_acquire(0) == 0
+    assert first._try_acquire(0) > 0.9
+    assert rl.TokenBucketLimiter("other", rpm=60, path=path)._try_acquire(0) == 0
+
+
+def test_token_bucket_waits_for_the_tokens(path):
+    limiter = rl.TokenBucketLimiter("model", rpm=600, tpm=6000, path=path, burst_seconds=10)
+
+    assert limiter._try_acquire(800) == 0
+    assert limiter._try_acquire(800) == pytest.approx(6.0, abs=0.1)
+
+
+def test_drain_slows_down_every_process(path):
+    first = rl.TokenBucketLimiter("model", rpm=60, path=path, burst_seconds=10)
+    second = rl.TokenBucketLimiter("model", rpm=60, path=path, burst_seconds=10)
+
+    first.drain()
+
+    assert second._try_acquire(0) == pytest.approx(1.0, abs=0.1)
+
+
+def test_call_retries_throttled_calls(path, monkeypatch):
+    monkeypatch.setattr(rl.time, "sleep", lambda seconds: None)
+    limiter = rl.TokenBucketLimiter("model", rpm=6000, path=path)
+    errors = [APIError(429, {"retry-after": "0"}), APIError(503)]
+    retries = []
+
+    def call() -> str:
+        if len(errors) > 0:
+            raise errors.pop(0)
+        return "ok"
+
+    assert rl.call_with_rate_limit(limiter, 0, call, lambda: retries.append(1)) == "ok"
+    assert len(retries) == 2
+
+
+def test_call_does_not_retry_client_errors(path):
+    limiter = rl.TokenBucketLimiter("model", rpm=6000, path=path)
+    calls = []
+
+    def call() -> None:
+        calls.append(1)
+        raise APIError(400)
+
+    with pytest.raises(APIError):
+        rl.call_with_rate_limit(limiter, 0, call)
+    assert len(calls) == 1
+
+
+def test_locked_database_error_is_not_hidden_by_the_rollback(path):
+    limiter = rl.TokenBucketLimiter("model", rpm=60, path=path)
+    limiter._connect = lambda: rl.sqlite3.connect(path, timeout=0.01, isolation_level=None)
+    writer = rl.sqlite3.connect(path, isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+
+    with pytest.raises(rl.sqlite3.OperationalError, match="locked"):
+        limiter._try_acquire(0)
+    writer.execute("ROLLBACK")
@@ -0,0 +1,43 @@
+from db.text_budget import clean_article_text
+
+ARTICLE_PARAGRAPHS = [
+    "The central bank kept its benchmark rate unchanged on Thursday and said in its "
+    "newsletter to investors that inflation was cooling faster than expected.",
+    "Share prices of the largest lenders rose more than 3% after the announcement, while "
+    "government bond yields fell to their lowest level since March.",
+    "Separately, EU regulators proposed changes to the cookie consent policy rules that "
+    "websites must follow, saying users should be able to refuse tracking in one click.",
+    'Analysts said the decision was widely expected. "The bank is buying time," one '
+    "economist at a Frankfurt brokerage said, adding that a cut in June remains likely.",
+    "The regulator also found that some news sites still required JavaScript to be enabled "
+    "before showing the cookie banner, which it said breached the current guidance.",
+    "All rights reserved by the original owners were transferred to the fund, the company "
+    "said in a filing, and the sale is expected to close in the third quarter.",
+]
+BOILERPLATE_PARAGRAPHS = [
+    "Advertisement",
+    "Sign up for our daily newsletter",
+    "Get our free newsletter to receive the top stories every morning.",
+    "We use cookies to improve your experience. By continuing you accept our cookie policy.",
+    "Please enable JavaScript to view the comments powered by our partner.",
+    "Share this article",
+    "Read more: Oil prices jump as supply concerns grow",
+    "Related stories:",
+    "Photo credit: Reuters",
+    "© 2026 Example News Ltd. All rights reserved.",
+]
+
+
+def test_clean_article_text_keeps_article_sentences():
+    text = "\n".join(
+        [BOILERPLATE_PARAGRAPHS[0], *ARTICLE_PARAGRAPHS[:3], *BOILERPLATE_PARAGRAPHS[1:]]
+        + ARTICLE_PARAGRAPHS[3:]
+    )
+
+    assert clean_article_text(text) == "\n\n".join(ARTICLE_PARAGRAPHS)
+
+
+def test_clean_article_text_drops_repeated_paragraphs():
+    text = "\n".join([ARTICLE_PARAGRAPHS[0], "", ARTICLE_PARAGRAPHS[0].upper()])
+
+    assert clean_article_text(text) == ARTICLE_PARAGRAPHS[0]
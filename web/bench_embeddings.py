@@ -0,0 +1,88 @@
+"""
+Benchmark of the embedding backends: model load time, latency per text, peak RSS and the
+cosine similarity of the onnx vectors to the torch ones.
+
+Each backend runs in its own process, so the RSS of one does not include the other. Run from
+the project root with `python -m web.bench_embeddings` (downloads the models on first use).
+"""
+
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+N_TEXTS = 50
+_WORDS = [
+    "the",
+    "cult",
+    "gathers",
+    "at",
+    "the",
+    "harbour",
+    "while",
+    "scholars",
+    "decode",
+    "the",
+    "drowned",
+    "city",
+    "and",
+    "the",
+    "stars",
+    "align",
+    "over",
+    "the",
+    "markets",
+    "as",
+    "ministers",
+    "deny",
+    "every",
+    "rumour",
+    "of",
+    "the",
+    "ancient",
+    "signal",
+]
+
+
+def _texts() -> list[str]:
+    rng = np.random.default_rng(0)
+    return [" ".join(rng.choice(_WORDS, size=rng.integers(20, 120))) for _ in range(N_TEXTS)]
+
+
+def _run_backend(backend: str, texts: list[str]) -> tuple[float, float, float, np.ndarray]:
+    """Load time (s), latency per text (s), peak RSS (MiB) and the vectors of one backend."""
+    import web.embeddings as embeddings
+
+    embeddings.EMBEDDING_BACKEND = backend
+    start = time.perf_counter()
+    embeddings.warm_up_embedding_model()
+    load_seconds = time.perf_counter() - start
+
+    model = embeddings.get_embedding_model()
+    start = time.perf_counter()
+    vectors = np.stack([model.embed(text) for text in texts])
+    seconds_per_text = (time.perf_counter() - start) / len(texts)
+    max_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on linux
+    return load_seconds, seconds_per_text, max_rss_mib, vectors
+
+
+def main() -> None:
+    texts = _texts()
+    context = multiprocessing.get_context("spawn")
+    vectors = {}
+    for backend in ["torch", "onnx"]:
+        with context.Pool(1) as pool:
+            load_seconds, seconds_per_text, max_rss_mib, vectors[backend] = pool.apply(
+                _run_backend, (backend, texts)
+            )
+        print(
+            f"backend={backend} load={load_seconds:.2f}s "
+            f"latency={seconds_per_text * 1e3:.2f}ms/text max_rss={max_rss_mib:.0f}MiB"
+        )
+    similarities = np.sum(vectors["torch"] * vectors["onnx"], axis=1)
+    print(f"cosine(torch, onnx) min={similarities.min():.4f} mean={similarities.mean():.4f}")
+
+
+if __name__ == "__main__":
+    main()
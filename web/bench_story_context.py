@@ -0,0 +1,79 @@
+"""
+Microbenchmark of the story context search: the per-scene python loop vs StoryEmbeddingIndex.
+
+Run from the project root with `python -m web.bench_story_context`.
+"""
+
+import time
+from collections.abc import Callable
+
+import numpy as np
+
+from web.mapping import EMBEDDING_VECTOR_SIZE
+from web.story_context import StoryEmbeddingIndex
+
+N_SCENES = [1_000, 10_000, 100_000]
+N_QUERIES = 20
+N_TOP = 3
+MIN_SIMILARITY = 0.1
+
+
+def _random_unit_vectors(rng: np.random.Generator, n: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, EMBEDDING_VECTOR_SIZE)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def _loop_top_k(query: np.ndarray, scenes: list[dict]) -> list[int]:
+    """The previous implementation of `find_story_context` (returns the scene numbers)."""
+    similarities = []
+    for scene in scenes:
+        scene_embedding = scene["scene_vector"]
+        if (scene_embedding is not None) and (not np.allclose(scene_embedding, 0)):
+            similarities.append((np.dot(query, scene_embedding), scene))
+    similarities.sort(key=lambda x: x[0], reverse=True)
+    return [s["scene_number"] for sim, s in similarities[:N_TOP] if sim > MIN_SIMILARITY]
+
+
+def _index_top_k(query: np.ndarray, index: StoryEmbeddingIndex) -> list[int]:
+    top = index.top_k(query, n_top=N_TOP, min_similarity=MIN_SIMILARITY)
+    return [s["scene_number"] for _, s in top]
+
+
+def _seconds_per_query(search: Callable[[np.ndarray], list[int]], queries: np.ndarray) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    for n_scenes in N_SCENES:
+        vectors = _random_unit_vectors(rng, n_scenes)
+        scenes = [
+            {"scene_number": i + 1, "scene_text": f"scene {i + 1}", "scene_vector": v}
+            for i, v in enumerate(vectors)
+        ]
+        # queries close to some scenes, so that the similarity threshold keeps a few results
+        targets = vectors[rng.choice(n_scenes, size=N_QUERIES, replace=False)]
+        queries = targets + 0.5 * _random_unit_vectors(rng, N_QUERIES)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        start = time.perf_counter()
+        index = StoryEmbeddingIndex(scenes)  # type: ignore[arg-type]
+        build_seconds = time.perf_counter() - start
+
+        for query in queries[:3]:
+            assert _loop_top_k(query, scenes) == _index_top_k(query, index)
+        loop_seconds = _seconds_per_query(lambda q, scenes=scenes: _loop_top_k(q, scenes), queries)
+        index_seconds = _seconds_per_query(lambda q, index=index: _index_top_k(q, index), queries)
+        print(
+            f"scenes={n_scenes} build={build_seconds * 1e3:.1f}ms "
+            f"loop={loop_seconds * 1e3:.2f}ms/query index={index_seconds * 1e3:.3f}ms/query "
+            f"speedup={loop_seconds / index_seconds:.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,9 @@ import atexit
 import json
 from datetime import datetime
 from functools import partial
+from typing import cast
 
+import numpy as np
 import psycopg
 import psycopg.sql as sql
 from envparse import env
@@ -16,6 +18,7 @@ from psycopg_pool import ConnectionPool
 import web.llm_cthulhu_logic as logic
 import web.llm_cthulhu_prompts as prompts
 import web.mapping as mapping
+from web.story_context import StoryEmbeddingIndex
 
 POSTGRES_HOST = env.str("POSTGRES_HOST")
 POSTGRES_PORT = env.int("POSTGRES_PORT")
@@ -82,6 +85,10 @@ def _create_news_table() -> None:
             sql.SQL(", ").join(col_definitions)
         )
         conn.execute(query)
+        conn.execute(
+            """CREATE INDEX IF NOT EXISTS news_scene_vector_hnsw_idx
+                ON news USING hnsw (scene_vector vector_cosine_ops)"""
+        )
         logger.info("initialized the local news db")
 
 
@@ -177,6 +184,49 @@ def _get_all_cthulhu_articles() -> list[dict]:
 #         return False
 
 
+def find_similar_scenes(
+    query_vector: np.ndarray, n_top: int, min_similarity: float
+) -> list[tuple[float, int, str]]:
+    """Top scenes by cosine similarity above `min_similarity` (HNSW index scan).
+
+    Returns (similarity, scene_number, scene_text) tuples, most similar first."""
+    with _pgpool.connection() as conn, conn.cursor() as c:
+        c.execute(
+            """SELECT 1 - (scene_vector <=> %(q)s) AS similarity, scene_number, scene_text
+                FROM news
+                WHERE scene_vector <=> %(q)s < %(max_distance)s
+                ORDER BY scene_vector <=> %(q)s
+                LIMIT %(n_top)s""",
+            {"q": query_vector, "max_distance": 1 - min_similarity, "n_top": n_top},
+        )
+        return [(float(sim), scene_number, text) for sim, scene_number, text in c.fetchall()]
+
+
+class PgSceneIndex:
+    """Story context search in postgres (pgvector), only the top rows are fetched.
+
+    New scenes that are not inserted yet are appended to (and searched in) memory."""
+
+    def __init__(self):
+        self._new_scenes = StoryEmbeddingIndex()
+
+    def append(self, scene: mapping.Scene) -> None:
+        self._new_scenes.append(scene)
+
+    def top_k(
+        self, query_vector: np.ndarray, n_top: int, min_similarity: float
+    ) -> list[tuple[float, mapping.Scene]]:
+        stored = [
+            (sim, cast(mapping.Scene, {"scene_number": scene_number, "scene_text": text}))
+            for sim, scene_number, text in find_similar_scenes(
+                query_vector, n_top=n_top, min_similarity=min_similarity
+            )
+        ]
+        results = stored + self._new_scenes.top_k(query_vector, n_top, min_similarity)
+        results.sort(key=lambda x: x[0], reverse=True)
+        return results[:n_top]
+
+
 def load_formatted_cthulhu_articles(scene_number: int | None = None) -> list[mapping.Scene]:
     """Get and format Cthulhu article(s) from the local db
 
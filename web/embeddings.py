@@ -0,0 +1,141 @@
+"""
+Sentence embedding backends for the scene vectors.
+
+Both backends run all-MiniLM-L6-v2 on CPU and return L2-normalized float32 vectors:
+- torch: sentence-transformers on PyTorch (the reference vectors)
+- onnx: the 8-bit quantized ONNX export of the same model run with onnxruntime, without
+  importing torch (faster per text, much smaller process)
+"""
+
+import platform
+import threading
+import time
+from typing import Protocol
+
+import numpy as np
+from envparse import env
+from loguru import logger
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_MODEL_REPO = f"sentence-transformers/{EMBEDDING_MODEL_NAME}"
+EMBEDDING_MAX_SEQ_LENGTH = 256  # max_seq_length of the sentence-transformers model
+EMBEDDING_BACKEND = env.str("EMBEDDING_BACKEND", default="torch")  # torch or onnx
+# file of the model repo, the default is the quantized export for the host CPU
+EMBEDDING_ONNX_FILE = env.str("EMBEDDING_ONNX_FILE", default="")
+EMBEDDING_ONNX_THREADS = env.int("EMBEDDING_ONNX_THREADS", default=0)  # 0: onnxruntime default
+EMBEDDING_WARM_UP = env.bool("EMBEDDING_WARM_UP", default=True)
+EMBEDDING_WARM_UP_TEXT = "The stars are right, and the tide rises over R'lyeh."
+
+_embedding_model: "EmbeddingModel | None" = None
+_embedding_model_lock = threading.Lock()
+
+
+class EmbeddingModel(Protocol):
+    def embed(self, text: str) -> np.ndarray:
+        """L2-normalized float32 embedding of the text."""
+        ...
+
+
+class SentenceTransformerEmbeddingModel:
+    """all-MiniLM-L6-v2 with sentence-transformers on PyTorch CPU."""
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(EMBEDDING_MODEL_NAME, device="cpu")
+
+    def embed(self, text: str) -> np.ndarray:
+        embedding = self._model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+        return embedding.astype(np.float32)
+
+
+def _default_onnx_file() -> str:
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+class OnnxEmbeddingModel:
+    """Quantized ONNX export of all-MiniLM-L6-v2 run with onnxruntime.
+
+    Same tokenization, mean pooling and normalization as the sentence-transformers pipeline,
+    so the vectors stay comparable with the ones stored by the torch backend."""
+
+    def __init__(
+        self, onnx_file: str = EMBEDDING_ONNX_FILE, n_threads: int = EMBEDDING_ONNX_THREADS
+    ):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        onnx_file = onnx_file or _default_onnx_file()
+        tokenizer_path = hf_hub_download(EMBEDDING_MODEL_REPO, "tokenizer.json")
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=EMBEDDING_MAX_SEQ_LENGTH)
+        self._tokenizer.no_padding()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = n_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(
+            hf_hub_download(EMBEDDING_MODEL_REPO, onnx_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {x.name for x in self._session.get_inputs()}
+        logger.debug(f"loaded onnx embedding model {onnx_file=}")
+
+    def embed(self, text: str) -> np.ndarray:
+        encoding = self._tokenizer.encode(text)
+        inputs = {
+            "input_ids": np.array([encoding.ids], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids], dtype=np.int64),
+        }
+        inputs = {k: v for k, v in inputs.items() if k in self._input_names}
+        token_embeddings = self._session.run(None, inputs)[0][0]  # (n_tokens, dim), no padding
+        embedding = token_embeddings.mean(axis=0)
+        embedding /= max(float(np.linalg.norm(embedding)), 1e-12)
+        return embedding.astype(np.float32)
+
+
+def get_embedding_model() -> EmbeddingModel:
+    """Get or load the embedding model of the configured backend (one per process)."""
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            logger.info(f"Loading embedding model backend={EMBEDDING_BACKEND}")
+            if EMBEDDING_BACKEND == "torch":
+                _embedding_model = SentenceTransformerEmbeddingModel()
+            elif EMBEDDING_BACKEND == "onnx":
+                _embedding_model = OnnxEmbeddingModel()
+            else:
+                raise ValueError(f"unknown {EMBEDDING_BACKEND=}")
+            logger.info("Embedding model loaded")
+    return _embedding_model
+
+
+def warm_up_embedding_model() -> None:
+    """Load the embedding model and run one text through it, so the first scene does not pay
+    for the model load and the first-inference setup."""
+    start = time.monotonic()
+    get_embedding_model().embed(EMBEDDING_WARM_UP_TEXT)
+    elapsed = time.monotonic() - start
+    logger.info(f"warmed up embedding model backend={EMBEDDING_BACKEND} elapsed={elapsed:.2f}s")
+
+
+def start_embedding_warm_up() -> threading.Thread | None:
+    """Warm up the embedding model in a background thread (None if EMBEDDING_WARM_UP is off).
+
+    A failed warm-up is only logged, the first embedding call loads the model again."""
+    if not EMBEDDING_WARM_UP:
+        return None
+
+    def _warm_up() -> None:
+        try:
+            warm_up_embedding_model()
+        except Exception as e:
+            logger.warning(f"failed to warm up embedding model: {e!r}")
+
+    thread = threading.Thread(target=_warm_up, name="embedding-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -18,7 +18,10 @@ import web.db_utils as dbu
 import web.mapping as mapping
 from prefect import flow, task
 from prefect.schedules import Cron
+from shared.llm_telemetry import track_llm_usage
+from shared.mongo_utils import get_news_collection
 from shared.paths import CTHULHU_IMAGE_DIR, WEB_ETL_LOG_PATH
+from web.embeddings import start_embedding_warm_up
 from web.llm_cthulhu_logic import add_cthulhu_images, generate_cthulhu_news
 
 load_dotenv(find_dotenv())
@@ -27,14 +30,8 @@ NEWS_UPDATE_HOURS = env.str("CTHULHU_NEWS_UPDATE_HOURS")
 NEWS_UPDATE_HOURS_PARSED = [int(x.strip()) for x in NEWS_UPDATE_HOURS.split(",")]
 NEWS_LOOKBACK_WINDOW_SECONDS = env.int("CTHULHU_NEWS_LOOKBACK_WINDOW_SECONDS")
 NEWS_FILL_MAX_WINDOW_DAYS = env.int("CTHULHU_NEWS_FILL_MAX_WINDOW_DAYS")
-MONGO_USER = env.str("MONGO_INITDB_ROOT_USERNAME")
-MONGO_PASSWORD = env.str("MONGO_INITDB_ROOT_PASSWORD")
-MONGO_HOST = env.str("MONGO_HOST")
-MONGO_PORT = env.int("MONGO_PORT")
-MONGODB_URI = f"mongodb://{MONGO_USER}:{MONGO_PASSWORD}@{MONGO_HOST}:{MONGO_PORT}?retryWrites=true&w=majority"
-MONGO_NEWS_DB = "news"
-MONGO_NEWS_COLLECTION = "gnews"
 CTHULHU_IMAGE_MODEL = "dall-e-3"
+CTHULHU_STORY_CONTEXT_SEARCH = env.str("CTHULHU_STORY_CONTEXT_SEARCH", default="pgvector")
 
 init_loguru(file_path=str(WEB_ETL_LOG_PATH))
 logger.debug(f"CTHULHU_IMAGE_DIR={CTHULHU_IMAGE_DIR.absolute()}")
@@ -62,9 +59,7 @@ def load_mongo_news_articles(
     logger.debug(
         f"loading mongo news articles from={dt_to_str(from_)} to={dt_to_str(to_)} limit={limit} "
     )
-    client: pymongo.MongoClient = pymongo.MongoClient(MONGODB_URI)
-    db = client.get_database(MONGO_NEWS_DB)
-    collection = db[MONGO_NEWS_COLLECTION]
+    collection = get_news_collection()
     filter_params: dict[str, dict] = {
         "gpt_summary": {"$exists": True},
     }
@@ -80,7 +75,10 @@ def load_mongo_news_articles(
         filter_params["title"] = {"$nin": exclude_titles}
 
     mongo_docs: Iterable[mapping.NewsArticle] = collection.find(
-        filter_params, sort=[("published_at", pymongo.DESCENDING)], limit=limit
+        filter_params,
+        projection=mapping.news_article_projection,
+        sort=[("published_at", pymongo.DESCENDING)],
+        limit=limit,
     )
 
     news_articles: list[mapping.NewsArticle] = []
@@ -128,7 +126,10 @@ def create_and_upload_cthulhu_article(
     elif news_articles[0]["title"] in news_titles:
         raise ValueError(f"News article with title '{news_articles[0]['title']}' already exists.")
     to_or_now = to_ if to_ is not None else datetime.now(tz=timezone.utc)
-    new_cthulhu_articles = generate_cthulhu_news(cthulhu_articles, news_articles, [to_or_now])
+    story_index = dbu.PgSceneIndex() if CTHULHU_STORY_CONTEXT_SEARCH == "pgvector" else None
+    new_cthulhu_articles = generate_cthulhu_news(
+        cthulhu_articles, news_articles, [to_or_now], story_index=story_index
+    )
     add_cthulhu_images(new_cthulhu_articles)
     # TODO: fix unique constraint violation (title)
     dbu.insert_cthulhu_articles(new_cthulhu_articles)
@@ -157,11 +158,15 @@ def create_and_upload_cthulhu_article_task(
     # retries=2,
     # retry_delay_seconds=30,
 )
+@track_llm_usage("update_cthulhu_articles")
 def update_cthulhu_articles(
     fill_gaps: bool = False, update_counters: bool = True, force_update: bool = False
 ) -> None:
     """Wrapper function to create and upload multiple Cthulhu articles."""
 
+    # load the embedding model while the counters and the news are loaded
+    start_embedding_warm_up()
+
     if update_counters:
         dbu.upd_all_counters()
         logger.info("updated all counters after news update")
@@ -1,6 +1,10 @@
 import base64
+import hashlib
 import random
+import threading
 import time
+from collections import OrderedDict
+from contextlib import aclosing
 from datetime import datetime
 
 import litellm
@@ -9,12 +13,15 @@ from dotenv import find_dotenv, load_dotenv
 from envparse import env
 from litellm.exceptions import ContentPolicyViolationError
 from loguru import logger
-from sentence_transformers import SentenceTransformer
 
 import web.llm_cthulhu_prompts as prompts
-from shared.llm_utils import get_llm_json_response
+from shared.llm_telemetry import track_llm_call
+from shared.llm_utils import astream_llm_json_fields, get_llm_json_response, image_generation
 from shared.paths import CTHULHU_IMAGE_DIR
+from shared.rate_limit import IMAGE_RATE_LIMIT_RPM, call_with_rate_limit, get_rate_limiter
+from web.embeddings import get_embedding_model
 from web.mapping import EMBEDDING_VECTOR_SIZE, NewsArticle, Scene, WinCounters
+from web.story_context import SceneIndex, StoryEmbeddingIndex
 
 load_dotenv(find_dotenv())
 
@@ -26,11 +33,16 @@ TEXT_MODEL_SUMMARIZER_MAX_TOKENS = env.int("TEXT_MODEL_SUMMARIZER_MAX_TOKENS")
 
 CTHULHU_IMAGE_MODEL = "dall-e-3"
 MAX_SCENE_UPDATES = 5
+# a "yes" on one of these makes the rewrite useless: the comment text is replaced as a whole
+CENSORSHIP_REJECT_FIELDS = ["spam", "illegal", "unsafe"]
+CENSORSHIP_REJECTED_COMMENT = "[❦]"
+EMBEDDING_MEMO_MAX_SIZE = env.int("EMBEDDING_MEMO_MAX_SIZE", default=1024)
 
 litellm.openai_key = OPENAI_API_KEY
 
 
-_embedding_model = None
+_embedding_memo: OrderedDict[bytes, np.ndarray] = OrderedDict()
+_embedding_memo_lock = threading.Lock()
 
 
 def _str_to_filename(string: str) -> str:
@@ -217,58 +229,59 @@ def sum_scene_counters(
     return total_counters
 
 
-def get_embedding_model() -> SentenceTransformer:
-    """Get or load the embedding model."""
-    global _embedding_model
-    if _embedding_model is None:
-        logger.info("Loading sentence-transformers model")
-        _embedding_model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
-        logger.info("Embedding model loaded")
-    return _embedding_model
-
-
 def generate_embedding_vector(text: str) -> np.ndarray:
-    """Generate embedding vector for the given text."""
+    """Generate embedding vector for the given text.
+
+    The vectors are memoized by text hash (bounded LRU) and returned read-only."""
     text = text.strip()
     if len(text) == 0:
         logger.warning("Empty text provided for embedding generation")
         return np.zeros(EMBEDDING_VECTOR_SIZE, dtype=np.float32)
+    key = hashlib.sha256(text.encode("utf-8")).digest()
+    with _embedding_memo_lock:
+        embedding = _embedding_memo.get(key)
+        if embedding is not None:
+            _embedding_memo.move_to_end(key)
+            return embedding
     if len(text) > 1000:
         logger.warning(f"Text for embedding is long length={len(text)}")
 
-    model = get_embedding_model()
-    embedding = model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
-    embedding = embedding.astype(np.float32)
+    embedding = get_embedding_model().embed(text)
+    embedding.setflags(write=False)
+    with _embedding_memo_lock:
+        _embedding_memo[key] = embedding
+        while len(_embedding_memo) > EMBEDDING_MEMO_MAX_SIZE:
+            _embedding_memo.popitem(last=False)
     return embedding
 
 
 def find_story_context(
-    text: str, scenes: list[Scene], n_top: int = 3, min_similarity: float = 0.1
+    text: str,
+    scenes: list[Scene],
+    n_top: int = 3,
+    min_similarity: float = 0.1,
+    index: SceneIndex | None = None,
+    query_vector: np.ndarray | None = None,
 ) -> list[str]:
-    """Find relevant story context using simple embedding similarity."""
+    """Find relevant story context using simple embedding similarity.
+
+    Pass the `index` of the scenes to reuse it across calls (it is built otherwise), and the
+    `query_vector` of the text if it is already computed."""
     if not text or not text.strip() or not scenes:
         return []
 
-    query_embedding = generate_embedding_vector(text)
+    if query_vector is None:
+        query_vector = generate_embedding_vector(text)
+    query_embedding = query_vector
     if np.allclose(query_embedding, 0):
         return []
 
-    # Calculate similarity with each scene
-    similarities = []
-    for scene in scenes:
-        scene_embedding = scene["scene_vector"]
-        if (scene_embedding is not None) and (not np.allclose(scene_embedding, 0)):
-            similarity = np.dot(query_embedding, scene_embedding)
-            similarities.append((similarity, scene))
-
-    # Sort by similarity and take top 3
-    similarities.sort(key=lambda x: x[0], reverse=True)
-
+    if index is None:
+        index = StoryEmbeddingIndex(scenes)
     results = []
-    for similarity, scene in similarities[:n_top]:
-        if similarity > min_similarity:
-            scene_text = scene["scene_text"]
-            results.append(f"Scene {scene['scene_number']}: {scene_text}")
+    for _, scene in index.top_k(query_embedding, n_top=n_top, min_similarity=min_similarity):
+        scene_text = scene["scene_text"]
+        results.append(f"Scene {scene['scene_number']}: {scene_text}")
 
     return results
 
@@ -281,8 +294,12 @@ def generate_cthulhu_news(
     gpt_model_summarizer: str = TEXT_MODEL_SUMMARIZER,
     gpt_writer_max_tokens: int = TEXT_MODEL_WRITER_MAX_TOKENS,
     gpt_summarizer_max_tokens: int = TEXT_MODEL_SUMMARIZER_MAX_TOKENS,
+    story_index: SceneIndex | None = None,
 ) -> list[Scene]:
-    """Generate new Cthulhu scenes based on the news articles provided."""
+    """Generate new Cthulhu scenes based on the news articles provided.
+
+    The story context is searched in `story_index` (the scenes so far), an in-memory index
+    is built if it is not given. The new scenes are appended to it."""
 
     assert len(news_articles) > 0
     assert len(news_articles) == len(timestamps)
@@ -290,6 +307,8 @@ def generate_cthulhu_news(
     n_initial_scenes = len(scenes_so_far)
 
     curr_win_counters = sum_scene_counters([a["scene_counters"] for a in scenes_so_far])
+    if story_index is None:
+        story_index = StoryEmbeddingIndex(scenes_so_far)
 
     for news_article, timestamp in zip(news_articles, timestamps, strict=False):
         if (len(scenes_so_far) > 0) and scenes_so_far[-1]["scene_ends_story"]:
@@ -315,6 +334,8 @@ def generate_cthulhu_news(
             gpt_query=scene_prompt,
             gpt_model=gpt_model_writer,
             gpt_max_tokens=gpt_writer_max_tokens,
+            call_site="scene",
+            expected_fields=prompts.scene_expected_json_fields,
         )
         scene_json = _parse_llm_json_response(
             expected_fields=prompts.scene_expected_json_fields,
@@ -328,12 +349,12 @@ def generate_cthulhu_news(
             f"added gpt generated fields title='{scene['scene_title']}' & scene_text='{scene['scene_text'][:20]}...'"
         )
 
-        scene["scene_vector"] = generate_embedding_vector(scene["scene_text"])
-        logger.debug("generated scene embedding vector")
-
+        draft_vector = generate_embedding_vector(scene["scene_text"])
         relevant_context = find_story_context(
             text=scene["scene_text"],
             scenes=scenes_so_far,
+            index=story_index,
+            query_vector=draft_vector,
         )
 
         if len(relevant_context) > 0:
@@ -346,6 +367,8 @@ def generate_cthulhu_news(
                 gpt_query=factcheck_prompt,
                 gpt_model=gpt_model_writer,
                 gpt_max_tokens=gpt_writer_max_tokens,
+                call_site="factcheck",
+                expected_fields=prompts.factcheck_story_expected_json_fields,
             )
             factcheck_json = _parse_llm_json_response(
                 expected_fields=prompts.factcheck_story_expected_json_fields,
@@ -356,12 +379,18 @@ def generate_cthulhu_news(
         else:
             scene["scene_text"] = scene["scene_text"]
 
+        # the vector of the final text (a memo hit if the factcheck kept the draft)
+        scene["scene_vector"] = generate_embedding_vector(scene["scene_text"])
+        logger.debug("generated scene embedding vector")
+
         summary_prompt = prompts.create_story_summary_prompt(scenes=scenes_so_far + [scene])
         response_json = get_llm_json_response(
             gpt_role=prompts.summary_role_prompt,
             gpt_query=summary_prompt,
             gpt_model=gpt_model_summarizer,
             gpt_max_tokens=gpt_summarizer_max_tokens,
+            call_site="story_summary",
+            expected_fields=prompts.summary_expected_json_fields,
         )
         summary_json = _parse_llm_json_response(
             expected_fields=prompts.summary_expected_json_fields,
@@ -382,13 +411,12 @@ def generate_cthulhu_news(
             curr_win_counters[k] += scene["scene_counters"][k]
 
         scenes_so_far.append(scene)
+        story_index.append(scene)
 
         if scene["story_winner"] != "NA":
             logger.info(f"winner={scene['story_winner']}")
             break
 
-        time.sleep(0.5)
-
     logger.info(
         f"generated scenes count={len(scenes_so_far)} scene_ends_story={scenes_so_far[-1]['scene_ends_story']}"
     )
@@ -397,15 +425,26 @@ def generate_cthulhu_news(
 
 
 def _call_image_generation(prompt: str):
-    """Helper to call litellm.image_generation with standard parameters."""
-    return litellm.image_generation(
-        model=CTHULHU_IMAGE_MODEL,
-        prompt=prompt,
-        size="1024x1024",
-        quality="standard",
-        n=1,
-        response_format="b64_json",
-    )
+    """Helper to call litellm.image_generation with standard parameters.
+
+    Shares the image rate limit with the other processes and retries 429/5xx errors."""
+    limiter = get_rate_limiter(CTHULHU_IMAGE_MODEL, rpm=IMAGE_RATE_LIMIT_RPM)
+    with track_llm_call("image", CTHULHU_IMAGE_MODEL) as call:
+        response = call_with_rate_limit(
+            limiter,
+            0,
+            lambda: image_generation(
+                model=CTHULHU_IMAGE_MODEL,
+                prompt=prompt,
+                size="1024x1024",
+                quality="standard",
+                n=1,
+                response_format="b64_json",
+            ),
+            on_retry=call.count_retry,
+        )
+        call.add_usage(response)
+    return response
 
 
 def add_cthulhu_images(scenes: list[Scene]) -> None:
@@ -457,22 +496,7 @@ def add_cthulhu_images(scenes: list[Scene]) -> None:
     logger.info(f"generated gpt cthulhu images count={len(scenes)}")
 
 
-def censor_comment(
-    comment: str,
-    scene: Scene,
-    gpt_model: str = TEXT_MODEL_WRITER,
-    gpt_max_tokens: int = TEXT_MODEL_WRITER_MAX_TOKENS,
-) -> prompts.CensoredComment:
-    """Verify if the comment is valid for the given scene."""
-
-    censorship_prompt = prompts.create_censorship_prompt(comment=comment, scene=scene)
-
-    response_json = get_llm_json_response(
-        gpt_role=prompts.censorship_role_prompt,
-        gpt_query=censorship_prompt,
-        gpt_model=gpt_model,
-        gpt_max_tokens=gpt_max_tokens,
-    )
+def _create_censored_comment(response_json: dict, scene: Scene) -> prompts.CensoredComment:
     c_json = _parse_llm_json_response(
         expected_fields=prompts.censorship_expected_json_fields,
         response_json=response_json,
@@ -512,5 +536,86 @@ def censor_comment(
     return censored_comment
 
 
+def _create_rejected_comment(response_json: dict) -> prompts.CensoredComment:
+    """Comment for a reject verdict received before the rewrite: the whole text is censored,
+    and it is never preselected."""
+    c_json = _parse_llm_json_response(
+        expected_fields=prompts.censorship_expected_json_fields,
+        response_json=response_json,
+        raise_on_error=False,
+    )
+    censored_comment: prompts.CensoredComment = {
+        "censored_comment": CENSORSHIP_REJECTED_COMMENT,
+        "scene_update": "",
+        "pertinence": c_json.get("pertinence", ""),
+        "stylistic_quality": c_json.get("stylistic_quality", ""),
+        "novelty": c_json.get("novelty", ""),
+        "contradicting": c_json.get("contradicting", ""),
+        "sentiment": c_json.get("sentiment", ""),
+        "aggressive": c_json.get("aggressive", ""),
+        "sexual": c_json.get("sexual", ""),
+        "spam": c_json.get("spam", ""),
+        "illegal": c_json.get("illegal", ""),
+        "unsafe": c_json.get("unsafe", ""),
+        "preselected": False,
+    }
+    return censored_comment
+
+
+def censor_comment(
+    comment: str,
+    scene: Scene,
+    gpt_model: str = TEXT_MODEL_WRITER,
+    gpt_max_tokens: int = TEXT_MODEL_WRITER_MAX_TOKENS,
+) -> prompts.CensoredComment:
+    """Verify if the comment is valid for the given scene."""
+
+    censorship_prompt = prompts.create_censorship_prompt(comment=comment, scene=scene)
+
+    response_json = get_llm_json_response(
+        gpt_role=prompts.censorship_role_prompt,
+        gpt_query=censorship_prompt,
+        gpt_model=gpt_model,
+        gpt_max_tokens=gpt_max_tokens,
+        call_site="censor",
+        expected_fields=prompts.censorship_expected_json_fields,
+    )
+    return _create_censored_comment(response_json, scene)
+
+
+async def acensor_comment(
+    comment: str,
+    scene: Scene,
+    gpt_model: str = TEXT_MODEL_WRITER,
+    gpt_max_tokens: int = TEXT_MODEL_WRITER_MAX_TOKENS,
+) -> prompts.CensoredComment:
+    """Async version of `censor_comment` (does not block the event loop).
+
+    The response is streamed and the verdict fields arrive before the rewritten comment:
+    a "yes" on one of CENSORSHIP_REJECT_FIELDS stops the stream and returns the comment
+    censored as a whole, without waiting for (and paying for) the rewrite."""
+
+    censorship_prompt = prompts.create_censorship_prompt(comment=comment, scene=scene)
+
+    start = time.monotonic()
+    response_json = {}
+    fields = astream_llm_json_fields(
+        gpt_role=prompts.censorship_role_prompt,
+        gpt_query=censorship_prompt,
+        gpt_model=gpt_model,
+        gpt_max_tokens=gpt_max_tokens,
+        call_site="censor",
+        expected_fields=prompts.censorship_expected_json_fields,
+    )
+    async with aclosing(fields):
+        async for field, value in fields:
+            response_json[field] = value
+            if (field in CENSORSHIP_REJECT_FIELDS) and (str(value).strip().lower() == "yes"):
+                elapsed = time.monotonic() - start
+                logger.info(f"rejected the comment early on {field=} elapsed={elapsed:.2f}s")
+                return _create_rejected_comment(response_json)
+    return _create_censored_comment(response_json, scene)
+
+
 def accept_or_refuse_comment(censored_comment: prompts.CensoredComment, scene: Scene) -> bool:
     return censored_comment["preselected"] and (len(scene["scene_updates"]) < MAX_SCENE_UPDATES)
@@ -678,7 +678,9 @@ Scene #{s["scene_number"]} parameters:
 
 scene_role_prompt = "You are a fiction writer who writes captivating suspenseful stories inspired by Cthulhu stories by H P Lovecraft."
 
-_scene_prompt = f"""\
+# The prompts start with a static prefix (byte-identical across calls, built once at import)
+# and end with the variable part, so that providers can reuse the cached prefix.
+_scene_prompt_prefix = f"""\
 Please finish the last scene of the following story based on the story outline and provided parameters.
 The new scene must be linked to the provided news article, revealing macabre truth behind the events described in the article.
 
@@ -707,21 +709,24 @@ III. The witnesses.
 The story is narrated through the media posts of **witnesses**, who have connections in both groups. Their information is based on leaked reports, emails, videos and rumors.
 
 
+"""
+
+_scene_prompt_suffix = """\
 ## SAMPLE SCENES (to guide the writer)
-{{sample_scenes}}
+{sample_scenes}
 
 
 ## STORY SO FAR
 
 ### STORY SUMMARY
-{{story_summary}}
+{story_summary}
 
 ### LAST SCENES
-{{story_so_far}}
+{story_so_far}
 
 
 ## NEW SCENE PARAMETERS
-{{scene_parameters}}
+{scene_parameters}
 
 
 Return JSON describing the new scene accoding to the NEW SCENE PARAMETERS with the following fields:
@@ -729,6 +734,8 @@ Return JSON describing the new scene accoding to the NEW SCENE PARAMETERS with t
 - scene_text: one paragraph (4 to 7 sentences) describing the events of the new scene
 """
 
+_sample_scenes_str = format_scenes_w_extra_info(_sample_scenes)
+
 scene_expected_json_fields = {
     "scene_title": {"votes": [], "split": False, "force_lower": False},
     "scene_text": {"votes": [], "split": False, "force_lower": False},
@@ -745,12 +752,12 @@ def create_new_scene_prompt(
     assert last_scenes_threshold > 0
     story_so_far_str = format_scenes_w_extra_info(scenes_so_far[-last_scenes_threshold:] + [new_scene])
     if len(scenes_so_far) <= include_sample_scenes_threshold:
-        sample_scenes = format_scenes_w_extra_info(_sample_scenes)
+        sample_scenes = _sample_scenes_str
     else:
         sample_scenes = "N/A"
     story_summary_str = "N/A" if len(scenes_so_far) == 0 else scenes_so_far[-1]["story_summary"]
     scene_parameters_str = _format_scene_parameters(new_scene)
-    return _scene_prompt.format(
+    return _scene_prompt_prefix + _scene_prompt_suffix.format(
         scene_parameters=scene_parameters_str,
         sample_scenes=sample_scenes,
         story_summary=story_summary_str,
@@ -851,9 +858,7 @@ Step 3: Evaluate the comment
 - unsafe: the comment contains content that is not safe for publication for adult audiences
 
 
-Return a JSON with the following fields:
-- censored_comment: revised comment here
-- scene_update: comment in the form 'There is a rumor that ...', or N/A
+Return a JSON with the following fields (in this order):
 - pertinence: low, medium, or high
 - premonition: yes or no
 - stylistic_quality: low, medium, or high
@@ -865,12 +870,14 @@ Return a JSON with the following fields:
 - spam: yes or no
 - illegal: yes or no
 - unsafe: yes or no
-
-COMMENT:
-{comment}
+- scene_update: comment in the form 'There is a rumor that ...', or N/A
+- censored_comment: revised comment here
 
 ARTICLE:
 {article}
+
+COMMENT:
+{comment}
 """
 
 
@@ -29,6 +29,10 @@ class NewsArticle(TypedDict):
     gpt_economic_impact: str
 
 
+# Mongo projection: fetch only the NewsArticle fields (never the raw page text/html)
+news_article_projection: dict[str, int] = dict.fromkeys(NewsArticle.__annotations__, 1)
+
+
 WinCounters = dict[str, float]
 
 
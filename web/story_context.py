@@ -0,0 +1,70 @@
+from typing import Protocol
+
+import numpy as np
+
+from web.mapping import EMBEDDING_VECTOR_SIZE, Scene
+
+
+class SceneIndex(Protocol):
+    """Similarity search over the scenes of a story (in memory or in postgres)."""
+
+    def append(self, scene: Scene) -> None: ...
+
+    def top_k(
+        self, query_vector: np.ndarray, n_top: int, min_similarity: float
+    ) -> list[tuple[float, Scene]]: ...
+
+
+class StoryEmbeddingIndex:
+    """Scene embeddings of a story stacked in one float32 matrix for vectorized top-k search.
+
+    Scenes without an embedding (None or all zeros) are kept but masked out. Appending a
+    scene is amortized O(1): the matrix grows by doubling."""
+
+    def __init__(self, scenes: list[Scene] | None = None, capacity: int = 64):
+        scenes = scenes or []
+        capacity = max(capacity, len(scenes))
+        self._vectors = np.zeros((capacity, EMBEDDING_VECTOR_SIZE), dtype=np.float32)
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._scenes: list[Scene] = []
+        self.extend(scenes)
+
+    def __len__(self) -> int:
+        return len(self._scenes)
+
+    def _grow(self) -> None:
+        capacity = 2 * len(self._vectors)
+        vectors = np.zeros((capacity, EMBEDDING_VECTOR_SIZE), dtype=np.float32)
+        vectors[: len(self._vectors)] = self._vectors
+        valid = np.zeros(capacity, dtype=bool)
+        valid[: len(self._valid)] = self._valid
+        self._vectors, self._valid = vectors, valid
+
+    def extend(self, scenes: list[Scene]) -> None:
+        start, end = len(self._scenes), len(self._scenes) + len(scenes)
+        while end > len(self._vectors):
+            self._grow()
+        for i, scene in enumerate(scenes, start=start):
+            if scene["scene_vector"] is not None:
+                self._vectors[i] = scene["scene_vector"]
+        # same test as `not np.allclose(vector, 0)`
+        self._valid[start:end] = np.any(np.abs(self._vectors[start:end]) > 1e-8, axis=1)
+        self._scenes.extend(scenes)
+
+    def append(self, scene: Scene) -> None:
+        self.extend([scene])
+
+    def top_k(
+        self, query_vector: np.ndarray, n_top: int, min_similarity: float
+    ) -> list[tuple[float, Scene]]:
+        """The `n_top` most similar scenes above `min_similarity`, most similar first."""
+        n = len(self._scenes)
+        if n == 0 or n_top <= 0:
+            return []
+        similarities = self._vectors[:n] @ query_vector.astype(np.float32, copy=False)
+        candidates = np.flatnonzero(self._valid[:n] & (similarities > min_similarity))
+        if len(candidates) > n_top:
+            top = np.argpartition(-similarities[candidates], n_top - 1)[:n_top]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-similarities[candidates], kind="stable")]
+        return [(float(similarities[i]), self._scenes[i]) for i in candidates]
@@ -2,6 +2,8 @@
 ### CHTHULHU-NEWS WEB INTERFACE ###
 ###################################
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -19,6 +21,8 @@ from PIL import Image
 import web.db_utils as dbu
 import web.llm_cthulhu_logic as logic
 import web.mapping as mapping
+from shared.llm_telemetry import render_prometheus_metrics
+from shared.llm_utils import close_llm_http_pool, open_llm_http_pool
 from shared.paths import CTHULHU_IMAGE_DIR, HTML_STATIC_DIR, TEMPLATES_DIR, WEB_APP_LOG_PATH
 
 load_dotenv(find_dotenv())
@@ -34,7 +38,15 @@ STATIC_IMAGE_TYPES: dict[str, dict] = {
     "small": {"size": (512, 512), "jpg_quality": 95},
 }
 
-app = FastAPI(title="Cthulhu-News")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    await open_llm_http_pool()
+    yield
+    await close_llm_http_pool()
+
+
+app = FastAPI(title="Cthulhu-News", lifespan=lifespan)
 app.mount(
     "/static",
     StaticFiles(directory=HTML_STATIC_DIR.absolute()),
@@ -166,6 +178,11 @@ async def news_article_page(request: Request, scene_number: int):
     return response
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_prometheus_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/react/{vote}/{scene_number}")
 async def react_to_article(
     vote: str, scene_number: int, user: str | None = None
@@ -193,7 +210,7 @@ async def submit_comment(
         return
 
     article = dbu.load_formatted_cthulhu_articles(scene_number=scene_number)[0]
-    censored_comment = logic.censor_comment(comment=comment, scene=article)
+    censored_comment = await logic.acensor_comment(comment=comment, scene=article)
 
     accepted = logic.accept_or_refuse_comment(censored_comment, article)
     comment_json: mapping.Comment = {